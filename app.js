@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', () => {
   const clearInputButton    = document.getElementById('clearInputButton');
   const copyButton          = document.getElementById('copyButton');
   const generateImageButton = document.getElementById('generateImageButton');
+  const cycleButton         = document.getElementById('cycleButton');
   const loadingStatus       = document.getElementById('loadingStatus');
   const compatMode          = document.getElementById('compatibilityMode');
   const modal               = document.getElementById('infoModal');
@@ -17,76 +18,480 @@ document.addEventListener('DOMContentLoaded', () => {
   let mappings = { full: null, less: null };
   let currentRawResult = '';
 
-  // 字典加载
-  Promise.all([
-    fetch('web_mapping.json').then(r => r.ok ? r.json() : Promise.reject('标准字典加载失败')),
-    fetch('web_mapping_less.json').then(r => r.ok ? r.json() : Promise.reject('兼容字典加载失败')),
-  ])
-    .then(([full, less]) => {
-      mappings.full = full;
-      mappings.less = less;
-      loadingStatus.style.display = 'none';
-      convertButton.disabled = false;
-      outputContainer.innerHTML =
-        '<span class="output-placeholder">在此输入文字，点击转换</span>';
+  // ── 后台转换（Web Worker） ─────────────────────────
+  // 字典分片与缺字表加载后同步给 worker；无法创建 worker 时（如以 file:// 打开）
+  // 在主线程分块转换，块间让出主线程。
+  let worker = null;
+  try {
+    worker = new Worker('worker.js');
+  } catch {
+    worker = null;
+  }
+
+  function mergeMappings(full, less) {
+    Object.assign(mappings.full, full);
+    Object.assign(mappings.less, less);
+    if (worker) worker.postMessage({ type: 'merge', full, less });
+  }
+
+  // ── 字典分片加载 ──────────────────────────────────
+  // 先加载 manifest 与热点分片（常用字）即可开始转换；
+  // 其余区块分片仅在输入中出现对应码点范围的字时才加载。
+  const SHARD_DIR = 'web_shards';
+  let shardManifest = null;
+  const shardLoads = new Map(); // file → Promise
+
+  function fetchJson(url, errMsg) {
+    return fetch(url).then(r => r.ok ? r.json() : Promise.reject(errMsg));
+  }
+
+  // 解码 HCMB 二进制映射（格式见 mapping_bin.py），写入 full / less 两个字典
+  function decodeMappingBin(buffer, full, less) {
+    const dv = new DataView(buffer);
+    const magic = String.fromCharCode(
+      dv.getUint8(0), dv.getUint8(1), dv.getUint8(2), dv.getUint8(3));
+    if (magic !== 'HCMB' || dv.getUint16(4, true) !== 1) throw new Error('字典格式错误');
+    const flags = dv.getUint16(6, true);
+    const count = dv.getUint32(8, true);
+    const valuesOff = 16;
+    let p = valuesOff + count * 4;
+    let key = 0;
+    const chars = new Array(count);
+    for (let i = 0; i < count; i++) {
+      const d = dv.getUint16(p, true);
+      p += 2;
+      if (d === 0) {
+        key = dv.getUint16(p, true) * 0x10000 + dv.getUint16(p + 2, true);
+        p += 4;
+      } else {
+        key += d;
+      }
+      const v = dv.getUint32(valuesOff + i * 4, true);
+      const char = chars[i] = String.fromCodePoint(key);
+      const target = String.fromCodePoint(v & 0x7FFFFFFF);
+      full[char] = target;
+      if (v >>> 31) less[char] = target;
+    }
+    // 兼容覆盖区：兼容目标字与标准目标字不同的条目
+    if (flags & 1) {
+      const n = dv.getUint32(p, true);
+      for (let j = 0; j < n; j++) {
+        const i = dv.getUint32(p + 4 + j * 4, true);
+        less[chars[i]] = String.fromCodePoint(dv.getUint32(p + 4 + (n + j) * 4, true));
+      }
+    }
+  }
+
+  function loadShard(file) {
+    if (!shardLoads.has(file)) {
+      const p = fetch(`${SHARD_DIR}/${file}`)
+        .then(r => r.ok ? r.arrayBuffer() : Promise.reject('字典分片加载失败'))
+        .then(buffer => {
+          const full = {};
+          const less = {};
+          decodeMappingBin(buffer, full, less);
+          mergeMappings(full, less);
+        })
+        .catch(err => { shardLoads.delete(file); throw err; });
+      shardLoads.set(file, p);
+    }
+    return shardLoads.get(file);
+  }
+
+  // 确保 text 中每个字所在的分片都已加载
+  function ensureShardsFor(text) {
+    if (!shardManifest) return Promise.resolve();
+    const needed = new Set();
+    for (const char of text) {
+      if (mappings.full[char] !== undefined) continue;
+      const cp = char.codePointAt(0);
+      for (const s of shardManifest.shards) {
+        if (cp >= s.range[0] && cp <= s.range[1]) { needed.add(s.file); break; }
+      }
+    }
+    return Promise.all([...needed].map(loadShard));
+  }
+
+  // ── 候选字轮换 ────────────────────────────────────
+  // web_candidates.bin（格式见 candidates_bin.py）按排序列出每个字的前 K 个候选，
+  // 第一次点「换字」时才加载。每点一次，各字改用下一个候选（按候选数取模）；
+  // 点「转换」回到第 0 个，即字典中的目标字。
+  const CANDIDATES_FILE = 'web_candidates.bin';
+  let candidates = null; // { full: {字: [候选…]}, less: {字: [兼容候选…]} }
+  let candidatesLoad = null;
+  let candidatePick = 0;
+
+  // 兼容模式只在带兼容位的候选中轮换，第 0 个即兼容字典中的目标字
+  function decodeCandidatesBin(buffer) {
+    const dv = new DataView(buffer);
+    const magic = String.fromCharCode(
+      dv.getUint8(0), dv.getUint8(1), dv.getUint8(2), dv.getUint8(3));
+    if (magic !== 'HCTK' || dv.getUint16(4, true) !== 1) throw new Error('候选字格式错误');
+    const count = dv.getUint32(8, true);
+    const total = dv.getUint32(12, true);
+    const countsOff = 16 + total * 4;
+    let p = countsOff + count;
+    let v = 16;
+    let key = 0;
+    const full = {};
+    const less = {};
+    for (let i = 0; i < count; i++) {
+      const d = dv.getUint16(p, true);
+      p += 2;
+      if (d === 0) {
+        key = dv.getUint16(p, true) * 0x10000 + dv.getUint16(p + 2, true);
+        p += 4;
+      } else {
+        key += d;
+      }
+      const all = [];
+      const compat = [];
+      const n = dv.getUint8(countsOff + i);
+      for (let j = 0; j < n; j++, v += 4) {
+        const x = dv.getUint32(v, true);
+        const target = String.fromCodePoint(x & 0x7FFFFFFF);
+        all.push(target);
+        if (x >>> 31) compat.push(target);
+      }
+      const char = String.fromCodePoint(key);
+      full[char] = all;
+      if (compat.length) less[char] = compat;
+    }
+    return { full, less };
+  }
+
+  function loadCandidates() {
+    if (!candidatesLoad) {
+      candidatesLoad = fetch(CANDIDATES_FILE)
+        .then(r => r.ok ? r.arrayBuffer() : Promise.reject('候选字加载失败'))
+        .then(buffer => {
+          candidates = decodeCandidatesBin(buffer);
+          if (worker) worker.postMessage({ type: 'candidates', ...candidates });
+        })
+        .catch(err => { candidatesLoad = null; throw err; });
+    }
+    return candidatesLoad;
+  }
+
+  function onMappingsReady() {
+    loadingStatus.style.display = 'none';
+    convertButton.disabled = false;
+    outputContainer.innerHTML =
+      '<span class="output-placeholder">在此输入文字，点击转换</span>';
+  }
+
+  function onMappingsError(err) {
+    loadingStatus.innerHTML =
+      `<span style="color:var(--accent);font-size:0.82rem">${err}</span>`;
+  }
+
+  fetchJson(`${SHARD_DIR}/manifest.json`, '分片清单加载失败')
+    .then(manifest => {
+      shardManifest = manifest;
+      mappings.full = {};
+      mappings.less = {};
+      return manifest.hot ? loadShard(manifest.hot) : null;
     })
-    .catch(err => {
-      loadingStatus.innerHTML =
-        `<span style="color:var(--accent);font-size:0.82rem">${err}</span>`;
+    .then(onMappingsReady)
+    .catch(() => {
+      // 无分片时回退为整体加载
+      shardManifest = null;
+      Promise.all([
+        fetchJson('web_mapping.json', '标准字典加载失败'),
+        fetchJson('web_mapping_less.json', '兼容字典加载失败'),
+      ])
+        .then(([full, less]) => {
+          mappings.full = {};
+          mappings.less = {};
+          mergeMappings(full, less);
+          onMappingsReady();
+        })
+        .catch(onMappingsError);
     });
 
-  // 缺字集合（需要 SVG fallback 的生僻字）
-  const missingCharsSet = new Set(Array.from(
-    "𲛯𮱅𲛣𲛍𭒘𭒩𮱛𭒬𭒴𭒣𮱌𲛰𰌆𲛢𭑷𰋶𰌖𲛐𲛧𲛋𭒨𭒵𰋺𲛵𱙭𭒅𱙯𱙅𭶃𮰿𱙂𰌉𭒙𰌇𱙤𭒕𭒢𮱇𭒈𲡱𱙃𭒃𮱂𲛊𰌐𭒗𲛒𰌄𱙘𭤇𮱄𱙕𲛷𱻲𭑾𰋵𱙏𰋸𭒳𭒡𱙮𭒟𮰾𰌁𭒠𭒯𭑵𰌋𱙇𰌈𰗻𭒪𭒭𲛭𭒤𮱉𰋿𰿧𮰽𮰻𱙣𲛞𰇭𰌍𭑩𱙨𮱏𭒏𭑴𱙓𰌃𲛛𭑼𭒫𰌌𱙪𮱎𭒛𱙱𭒖𮱒𱙆𲛙𭒮𭒦𮱆𱙈𰌙𱙟𭂾𭒁𰌊𮱍𭑲𮆝𲛗𲛴𱙐𰋷𲛤𮱙𱨌𮱘𮱐𮰹𲛺𭑪𲽐𲛨𲛲𱙩𮓃𲛳𱙢𲛘𱙑𱦢𲛱𮰸𭑫𱙦𭔖𭒝𲛜𰌒𭑭𲛑𲛓𮱈𱙛𭒂𮱁𱙖𰋾𲛻𱙴𭒥𮍳𮱃𲛬𰌅𮱑𰋽𭑺𭑸𮱕𭒎𲛌𱙫𲛸𰋻𮱖𲛪𭑨𭒐𭒑𭑹𰌔𲛏𰌛𭒧𭑳𱙒𱙡𲛥𮱋𱙄𱙝𱙔𲛖𭒓𮱀𰌀𱙍𮱓𲛕𱙋𭑱𱙎𲛎𭒄𱙙𭒌𮰷𮱚𲛝𭑽𲛔𭤋𱙠𰋹𮰺𲛶𭒇𲛠𮱊𱙞𭑰𭑬𭒚𰌂𭒜𰌎𭑯𭑧𭒆𱙊𲛡𮱔𭑶𰌘𱼰𰌚𮰼𭴇𰋼𲛮𱆶𲛟𰐈𮣭𱀤𱙗𲛩𭑮𱙌𭒔𱙰𭑻𰌑𲍣𲛫𮱗𭒉𱙧𱙚𱙉𮡎𭒀𱙥𭒞𱙲𱙁"
-  ));
+  // 输入时提前加载所需分片，点击转换时通常已就绪
+  let prefetchTimer = null;
+  inputText.addEventListener('input', () => {
+    clearTimeout(prefetchTimer);
+    prefetchTimer = setTimeout(() => ensureShardsFor(inputText.value).catch(() => {}), 300);
+  });
 
-  // 转换时预加载的 <img> 元素缓存（char → HTMLImageElement）
-  // 这样生成图片时直接复用已在浏览器 HTTP 缓存中的资源，无需重新请求
+  // 缺字集合（需要 SVG fallback 的生僻字），由 build.py 按字体覆盖生成
+  let missingCharsSet = new Set();
+  const missingGlyphsReady = fetchJson('missing_glyphs.json', '缺字表加载失败')
+    .then(chars => {
+      missingCharsSet = new Set(Array.from(chars));
+      if (worker) worker.postMessage({ type: 'missing', chars });
+    })
+    .catch(() => {});
+
+  // ── 缺字字形包 ────────────────────────────────────
+  // build.py 把用到的缺字 SVG 打包为 glyphs.bin（格式见 glyph_bundle.py），
+  // 首次遇到缺字时整包加载一次；包中没有的字仍回退到 GlyphWiki。
+  const GLYPH_BUNDLE = 'glyphs.bin';
+  const glyphBundle = new Map();   // char → Uint8Array（SVG 字节）
+  const glyphUrlCache = new Map(); // char → URL
+  let glyphBundleLoad = null;
+
+  function decodeGlyphBundle(buffer) {
+    const dv = new DataView(buffer);
+    const magic = String.fromCharCode(
+      dv.getUint8(0), dv.getUint8(1), dv.getUint8(2), dv.getUint8(3));
+    if (magic !== 'HCGB' || dv.getUint16(4, true) !== 1) throw new Error('字形包格式错误');
+    const count = dv.getUint32(8, true);
+    const base = 16 + count * 12;
+    for (let i = 0; i < count; i++) {
+      const p = 16 + i * 12;
+      const cp = dv.getUint32(p, true);
+      const offset = dv.getUint32(p + 4, true);
+      const length = dv.getUint32(p + 8, true);
+      glyphBundle.set(String.fromCodePoint(cp), new Uint8Array(buffer, base + offset, length));
+    }
+  }
+
+  function loadGlyphBundle() {
+    if (!glyphBundleLoad) {
+      glyphBundleLoad = fetch(GLYPH_BUNDLE)
+        .then(r => r.ok ? r.arrayBuffer() : Promise.reject('字形包加载失败'))
+        .then(decodeGlyphBundle)
+        .catch(() => {}); // 没有字形包时全部回退到 GlyphWiki
+    }
+    return glyphBundleLoad;
+  }
+
+  function glyphUrl(char) {
+    if (!glyphUrlCache.has(char)) {
+      const bytes = glyphBundle.get(char);
+      const hex = char.codePointAt(0).toString(16).toLowerCase();
+      glyphUrlCache.set(char, bytes
+        ? URL.createObjectURL(new Blob([bytes], { type: 'image/svg+xml' }))
+        : `https://glyphwiki.org/glyph/u${hex}.svg`);
+    }
+    return glyphUrlCache.get(char);
+  }
+
+  // 缺字字形的 <img> 元素缓存（char → HTMLImageElement），显示与生成图片共用。
+  // 输出是虚拟化的，未滚动到的块不会渲染，生成图片时按需创建
   const glyphImgCache = new Map();
 
-  function getGlyphHtml(char) {
-    const hex = char.codePointAt(0).toString(16).toLowerCase();
-    const url = `https://glyphwiki.org/glyph/u${hex}.svg`;
-    // 同时预加载为 <img>，写入缓存，供图片生成时直接复用
-    if (!glyphImgCache.has(char)) {
-      const img = new Image();
+  function getGlyphImg(char) {
+    let img = glyphImgCache.get(char);
+    if (!img) {
+      img = new Image();
       img.crossOrigin = 'anonymous';
-      img.src = url;
+      img.src = glyphUrl(char);
       glyphImgCache.set(char, img);
     }
+    return img;
+  }
+
+  function getGlyphHtml(char) {
+    const url = glyphUrl(char);
+    // 同时预加载为 <img>，供图片生成时直接复用
+    getGlyphImg(char);
     return `<span class="svg-icon" title="${char}" style="-webkit-mask-image:url('${url}');mask-image:url('${url}');"></span>`;
   }
 
   // ── 转换 ──────────────────────────────────────────
-  convertButton.addEventListener('click', () => {
+  const MAIN_THREAD_CHUNK = 1 << 14; // 主线程回退时每块码元数
+  let convertJobId = 0;
+  const convertJobs = new Map(); // id → { text, compat, pick, onChunk, resolve }
+
+  // 逐块转换 text，每块调用 onChunk({ text, hasMissing, done })，全部完成后 resolve。
+  // pick > 0 时各字取第 pick 个候选（需先 loadCandidates）
+  function convertText(text, compat, onChunk, pick = 0) {
+    const id = ++convertJobId;
+    if (!worker) return convertOnMainThread(text, compat, onChunk, pick);
+    return new Promise(resolve => {
+      convertJobs.set(id, { text, compat, pick, onChunk, resolve });
+      worker.postMessage({ type: 'convert', id, text, compat, pick });
+    });
+  }
+
+  async function convertOnMainThread(text, compat, onChunk, pick = 0) {
+    const mapping = compat ? mappings.less : mappings.full;
+    const cands = pick && candidates ? (compat ? candidates.less : candidates.full) : null;
+    let i = 0;
+    do {
+      let end = Math.min(i + MAIN_THREAD_CHUNK, text.length);
+      const c = text.charCodeAt(end - 1);
+      if (end < text.length && c >= 0xD800 && c <= 0xDBFF) end++;
+      let out = '';
+      let hasMissing = false;
+      for (const char of text.slice(i, end)) {
+        const list = cands && cands[char];
+        const target = list ? list[pick % list.length]
+          : mapping[char] !== undefined ? mapping[char] : char;
+        out += target;
+        if (missingCharsSet.has(target)) hasMissing = true;
+      }
+      onChunk({ text: out, hasMissing, done: end >= text.length });
+      i = end;
+      await new Promise(r => setTimeout(r, 0));
+    } while (i < text.length);
+  }
+
+  if (worker) {
+    worker.onmessage = e => {
+      const msg = e.data;
+      const job = convertJobs.get(msg.id);
+      if (!job) return;
+      job.onChunk(msg);
+      if (msg.done) {
+        convertJobs.delete(msg.id);
+        job.resolve();
+      }
+    };
+    // worker 脚本加载失败等：改为主线程转换，未完成的任务重新执行
+    worker.onerror = () => {
+      worker.terminate();
+      worker = null;
+      for (const [id, job] of convertJobs) {
+        convertJobs.delete(id);
+        convertOnMainThread(job.text, job.compat, job.onChunk, job.pick).then(job.resolve);
+      }
+    };
+  }
+
+  // ── 虚拟化输出 ────────────────────────────────────
+  // 结果在换行处切成约 OUTPUT_BLOCK 个码元的块，每块一个 <div>。只有进入可视区域
+  // （上下各留一屏余量）的块才生成内容，离开后换成等高的空占位，DOM 规模与
+  // 文本长度无关。块尾保留换行符（渲染为末尾的 <br>，不产生额外空行）；
+  // 超过 OUTPUT_BLOCK 仍无换行的段落会在块边界处折行。
+  const OUTPUT_BLOCK = 4000;
+  const blockTexts = new WeakMap(); // div → 文本
+  const blockObserver = new IntersectionObserver(entries => {
+    for (const { target: div, isIntersecting } of entries) {
+      if (isIntersecting) {
+        if (!div.hasChildNodes()) {
+          div.style.height = '';
+          div.innerHTML = blockHtml(blockTexts.get(div));
+        }
+      } else if (div.hasChildNodes()) {
+        div.style.height = `${div.offsetHeight}px`;
+        div.textContent = '';
+      }
+    }
+  }, { root: outputContainer, rootMargin: '100% 0px' });
+
+  let pendingOutput = '';
+  let outputGeneration = 0;
+
+  function charHtml(target) {
+    if (missingCharsSet.has(target)) return getGlyphHtml(target);
+    if (target === '<') return '&lt;';
+    if (target === '>') return '&gt;';
+    if (target === '&') return '&amp;';
+    if (target === '\n') return '<br>';
+    return target;
+  }
+
+  function blockHtml(text) {
+    let html = '';
+    for (const char of text) html += charHtml(char);
+    return html;
+  }
+
+  // 未渲染块的占位高度：按容器宽度与字号估算行数
+  function estimateBlockHeight(text) {
+    const style = getComputedStyle(outputContainer);
+    const fontSize = parseFloat(style.fontSize) || 16;
+    const lineH = parseFloat(style.lineHeight) || fontSize * 1.65;
+    const perLine = Math.max(1, Math.floor(outputContainer.clientWidth / fontSize));
+    let lines = 0;
+    for (const line of text.split('\n')) lines += Math.max(1, Math.ceil(line.length / perLine));
+    if (text.endsWith('\n')) lines--;
+    return Math.max(1, lines) * lineH;
+  }
+
+  function resetOutput() {
+    outputGeneration++;
+    blockObserver.disconnect();
+    pendingOutput = '';
+    outputContainer.textContent = '';
+  }
+
+  function appendBlock(text) {
+    const div = document.createElement('div');
+    div.className = 'output-block';
+    div.style.height = `${estimateBlockHeight(text)}px`;
+    blockTexts.set(div, text);
+    outputContainer.appendChild(div);
+    blockObserver.observe(div);
+  }
+
+  function appendOutput(text, done) {
+    pendingOutput += text;
+    while (pendingOutput.length >= OUTPUT_BLOCK || (done && pendingOutput)) {
+      let cut = pendingOutput.length;
+      if (cut > OUTPUT_BLOCK) {
+        const nl = pendingOutput.lastIndexOf('\n', OUTPUT_BLOCK);
+        cut = nl >= 0 ? nl + 1 : OUTPUT_BLOCK;
+        const c = pendingOutput.charCodeAt(cut - 1);
+        if (c >= 0xD800 && c <= 0xDBFF) cut++;
+      } else if (!done) {
+        break;
+      }
+      appendBlock(pendingOutput.slice(0, cut));
+      pendingOutput = pendingOutput.slice(cut);
+    }
+  }
+
+  // 转换输入框中的文字；pick 为各字所取的候选序号（0 即字典中的目标字）
+  async function runConversion(pick) {
     if (!mappings.full || !mappings.less) return;
 
     const original = inputText.value;
     if (!original) { showToast('请输入需要转换的文字', true); return; }
 
-    const mapping = compatMode.checked ? mappings.less : mappings.full;
-    const rawParts = [];
+    try {
+      await Promise.all([
+        ensureShardsFor(original), missingGlyphsReady, pick ? loadCandidates() : null,
+      ]);
+    } catch (err) {
+      showToast(String(err), true);
+      return;
+    }
 
-    const htmlParts = Array.from(original).map(char => {
-      const target = mapping[char] !== undefined ? mapping[char] : char;
-      rawParts.push(target);
+    convertButton.disabled = true;
+    cycleButton.disabled = true;
+    resetOutput();
+    const generation = outputGeneration;
+    const rawChunks = [];
+    // 块按顺序渲染；含缺字的块先等字形包加载
+    let rendering = Promise.resolve();
+    try {
+      await convertText(original, compatMode.checked, msg => {
+        rawChunks.push(msg.text);
+        rendering = rendering.then(async () => {
+          if (msg.hasMissing) await loadGlyphBundle();
+          if (generation === outputGeneration) appendOutput(msg.text, msg.done);
+        });
+      }, pick);
+      await rendering;
+      if (generation === outputGeneration) currentRawResult = rawChunks.join('');
+    } finally {
+      convertButton.disabled = false;
+      cycleButton.disabled = false;
+    }
+  }
 
-      if (missingCharsSet.has(target)) return getGlyphHtml(target);
-      if (target === '<') return '&lt;';
-      if (target === '>') return '&gt;';
-      if (target === '&') return '&amp;';
-      if (target === '\n') return '<br>';
-      return target;
-    });
+  convertButton.addEventListener('click', () => {
+    candidatePick = 0;
+    runConversion(0);
+  });
 
-    currentRawResult = rawParts.join('');
-    outputContainer.innerHTML = htmlParts.join('');
+  // ── 换字 ──────────────────────────────────────────
+  cycleButton.addEventListener('click', () => {
+    candidatePick++;
+    runConversion(candidatePick);
   });
 
   // ── 清空 ──────────────────────────────────────────
   clearInputButton.addEventListener('click', () => {
     inputText.value = '';
     currentRawResult = '';
+    resetOutput();
     outputContainer.innerHTML =
       '<span class="output-placeholder">在此输入文字，点击转换</span>';
     inputText.focus();
@@ -120,21 +525,22 @@ document.addEventListener('DOMContentLoaded', () => {
   function parseToTokens(text) {
     return Array.from(text).map(char => {
       if (missingCharsSet.has(char)) {
-        return { type: 'img', char, img: glyphImgCache.get(char) || null };
+        return { type: 'img', char, img: getGlyphImg(char) };
       }
       return { type: 'text', value: char === '\n' ? '\n' : char };
     });
   }
 
-  // 等待 img 列表加载，单张超时 5s 则跳过
+  // 等待 img 列表加载（同一元素只等一次），单张超时 5s 则跳过
   function waitForImages(imgs) {
-    return Promise.all(imgs.map(img => {
+    return Promise.all([...new Set(imgs)].map(img => {
       if (!img) return Promise.resolve();
-      if (img.complete && img.naturalWidth > 0) return Promise.resolve();
+      if (img.complete) return Promise.resolve();
       return new Promise(res => {
+        const done = () => { clearTimeout(timer); res(); };
         const timer = setTimeout(res, 5000);
-        img.onload  = () => { clearTimeout(timer); res(); };
-        img.onerror = () => { clearTimeout(timer); res(); };
+        img.addEventListener('load', done, { once: true });
+        img.addEventListener('error', done, { once: true });
       });
     }));
   }
@@ -167,6 +573,17 @@ document.addEventListener('DOMContentLoaded', () => {
       return mctx.measureText(text).width;
     }
 
+    // 正文字号固定，每个不同字符只测量一次
+    const glyphWidths = new Map();
+    function glyphWidth(char) {
+      let w = glyphWidths.get(char);
+      if (w === undefined) {
+        w = measureText(char, FONT_STACK);
+        glyphWidths.set(char, w);
+      }
+      return w;
+    }
+
     // 把 tokens 按 INNER_W 折行，返回 lines 数组
     // 每行是 [{type,value?,char?,img?,x}] 加上 lineWidth
     function layoutTokens(tokens) {
@@ -187,7 +604,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
         const w = tok.type === 'img'
           ? GLYPH_SZ
-          : measureText(tok.value, FONT_STACK);
+          : glyphWidth(tok.value);
 
         if (x + w > INNER_W && line.length > 0) pushLine();
         line.push({ ...tok, x, w });
@@ -197,6 +614,10 @@ document.addEventListener('DOMContentLoaded', () => {
       return lines;
     }
 
+    // 字形包先加载完，缺字才会取包中的 SVG 而非逐字请求 GlyphWiki
+    if (Array.from(originalText + resultText).some(c => missingCharsSet.has(c))) {
+      await loadGlyphBundle();
+    }
     const origTokens  = parseToTokens(originalText);
     const resultTokens = parseToTokens(resultText);
     const origLines   = layoutTokens(origTokens);
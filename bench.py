@@ -0,0 +1,315 @@
+"""
+bench.py — herchar 管线基准测试
+
+用法:
+    python bench.py                          # 运行全部基准，结果写入 bench_results.json
+    python bench.py -k mapping               # 只运行名称含 mapping 的基准
+    python bench.py --scale 10               # 另测 Ext-B 文件复制 10 份的合成语料
+    python bench.py --save-baseline          # 同时把结果存为 bench_baseline.json
+    python bench.py --baseline bench_baseline.json --threshold 0.2
+                                             # 与基线比较，任一项慢 20% 以上时退出码为 1
+
+每项基准先计时 --repeat 次取最小值，再在 tracemalloc 下单独运行一次记录峰值内存。
+基准在临时目录中运行（raw_data 以符号链接引入，已有的 pinyin_table.json 会复制过去），
+不会改动仓库中的构建产物。
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import build
+import utils
+
+RESULTS_FILE = "bench_results.json"
+BASELINE_FILE = "bench_baseline.json"
+# 低于此绝对差值（秒）的变化视为噪声，不判定为回退
+MIN_REGRESSION_DELTA = 0.005
+
+
+# ──────────────────────────────────────────────
+# 基准数据（惰性构建，各基准共用）
+# ──────────────────────────────────────────────
+
+class Fixtures:
+    def __init__(self):
+        self._cache = {}
+
+    def _get(self, key, factory):
+        if key not in self._cache:
+            with contextlib.redirect_stdout(io.StringIO()):
+                self._cache[key] = factory()
+        return self._cache[key]
+
+    @property
+    def raw_files(self):
+        return self._get("raw_files", build._raw_data_files)
+
+    @property
+    def ids_strings(self):
+        def factory():
+            strings = []
+            for f in self.raw_files:
+                for info in build.parse_ids_file(f).values():
+                    strings.append(info["IDS"])
+                    if info["IDS_apparent"]:
+                        strings.append(info["IDS_apparent"])
+            return strings
+        return self._get("ids_strings", factory)
+
+    @property
+    def ctx(self):
+        """运行过 nyu、basic 两个阶段的内存上下文。"""
+        def factory():
+            ctx = {"write_intermediates": False}
+            build.stage_nyu(ctx)
+            build.stage_basic(ctx)
+            return ctx
+        return self._get("ctx", factory)
+
+    @property
+    def basic_ids_lookup(self):
+        return self._get("lookup", lambda: build._basic_ids_lookup(self.ctx))
+
+    @property
+    def structural(self):
+        return self._get("structural", lambda: build._structural_match(
+            self.ctx["basic"], self.ctx["nyu"], self.basic_ids_lookup
+        )[0])
+
+    @property
+    def py_table(self):
+        ctx = self.ctx
+        return self._get("py_table", lambda: build._shared_pinyin_table(
+            ctx, build._pinyin_chars(ctx["basic"], ctx["nyu"])
+        ))
+
+    @property
+    def after_advanced(self):
+        def factory():
+            mapping = dict(self.structural)
+            build._advanced_mapping(self.ctx["basic"], self.ctx["nyu"], mapping, self.py_table)
+            return mapping
+        return self._get("after_advanced", factory)
+
+    @property
+    def final_mapping(self):
+        def factory():
+            mapping = dict(self.after_advanced)
+            build._fill_by_pinyin(self.ctx["basic"], self.ctx["nyu"], mapping, self.py_table)
+            return dict(sorted(mapping.items()))
+        return self._get("final_mapping", factory)
+
+
+# ──────────────────────────────────────────────
+# 基准定义：(名称, prepare, run)
+# prepare(fx) 不计时，返回传给 run 的参数元组；run(*args) 计时
+# ──────────────────────────────────────────────
+
+def _tokenize_all(fn, strings, *args):
+    utils.tokenize_ids.cache_clear()
+    for s in strings:
+        fn(s, *args)
+
+
+def _run_quiet(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn(*args)
+
+
+BENCHMARKS = [
+    ("parse_ids_file",
+     lambda fx: (fx.raw_files,),
+     lambda files: [build.parse_ids_file(f) for f in files]),
+    ("load_ids_records.cached",
+     lambda fx: (fx.raw_files,),
+     lambda files: [build.load_ids_records(f) for f in files]),
+    ("utils.get_ids_components_list",
+     lambda fx: (fx.ids_strings,),
+     lambda strings: _tokenize_all(utils.get_ids_components_list, strings, "女")),
+    ("utils.get_components_except_target_char",
+     lambda fx: (fx.ids_strings,),
+     lambda strings: _tokenize_all(utils.get_components_except_target_char, strings)),
+    ("utils.extract_single_component",
+     lambda fx: (fx.ids_strings,),
+     lambda strings: _tokenize_all(utils.extract_single_component, strings)),
+    ("stage_nyu",
+     lambda fx: ({"write_intermediates": False},),
+     lambda ctx: _run_quiet(build.stage_nyu, ctx)),
+    ("stage_basic",
+     lambda fx: ({"write_intermediates": False, "nyu": fx.ctx["nyu"]},),
+     lambda ctx: _run_quiet(build.stage_basic, ctx)),
+    ("mapping.index_build",
+     lambda fx: ({"shared": {"basic_records": fx.ctx["shared"]["basic_records"]}},),
+     lambda ctx: _run_quiet(build._basic_ids_lookup, ctx)),
+    ("mapping.structural_match",
+     lambda fx: (fx.ctx["basic"], fx.ctx["nyu"], fx.basic_ids_lookup),
+     build._structural_match),
+    ("mapping.advanced_mapping",
+     lambda fx: (fx.ctx["basic"], fx.ctx["nyu"], dict(fx.structural), fx.py_table),
+     lambda *args: _run_quiet(build._advanced_mapping, *args)),
+    ("mapping.fill_by_pinyin",
+     lambda fx: (fx.ctx["basic"], fx.ctx["nyu"], dict(fx.after_advanced), fx.py_table),
+     lambda *args: _run_quiet(build._fill_by_pinyin, *args)),
+    ("stage_web",
+     lambda fx: ({"mapping": fx.final_mapping},),
+     lambda ctx: _run_quiet(build.stage_web, ctx)),
+]
+
+
+def _scaled_benchmarks(scale, workdir):
+    """Ext-B 文件复制 scale 份的合成语料上的解析与 nyu 阶段。"""
+    raw_dir = os.path.join(workdir, f"raw_data_x{scale}")
+    os.makedirs(raw_dir, exist_ok=True)
+    # 只复制 IDS 文件：MANIFEST.json 不含副本，也不是语料
+    for src in build._raw_data_files():
+        f = os.path.basename(src)
+        shutil.copy(src, os.path.join(raw_dir, f))
+        if f.startswith("IDS-UCS-Ext-B"):
+            # 副本标记插在 .txt 之前，压缩后缀留在末尾，读取时才会被识别
+            name = build.raw_name(f)
+            stem, ext = os.path.splitext(name)
+            compression = f[len(name):]
+            for i in range(1, scale):
+                shutil.copy(src, os.path.join(raw_dir, f"{stem}.rep{i}{ext}{compression}"))
+    files = sorted(os.path.join(raw_dir, f) for f in os.listdir(raw_dir))
+
+    def run_stage_nyu():
+        old = build.RAW_DATA_DIR
+        build.RAW_DATA_DIR = raw_dir
+        try:
+            _run_quiet(build.stage_nyu, {"write_intermediates": False})
+        finally:
+            build.RAW_DATA_DIR = old
+
+    return [
+        (f"scaled_x{scale}.parse_ids_file",
+         lambda fx: (files,),
+         lambda fs: [build.parse_ids_file(f) for f in fs]),
+        (f"scaled_x{scale}.stage_nyu",
+         lambda fx: (),
+         run_stage_nyu),
+    ]
+
+
+# ──────────────────────────────────────────────
+# 计时与比较
+# ──────────────────────────────────────────────
+
+def measure(prepare, run, fx, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        args = prepare(fx)
+        start = time.perf_counter()
+        run(*args)
+        best = min(best, time.perf_counter() - start)
+
+    args = prepare(fx)
+    tracemalloc.start()
+    try:
+        run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(best, 6), "peak_mb": round(peak / 2**20, 3)}
+
+
+def compare(results, baseline, threshold):
+    """返回回退项列表 [(名称, 基线秒, 当前秒, 比值)]。"""
+    regressions = []
+    print(f"\n{'基准':<44}{'基线(s)':>10}{'当前(s)':>10}{'比值':>8}")
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:<44}{'-':>10}{cur['seconds']:>10.4f}{'新增':>8}")
+            continue
+        ratio = cur["seconds"] / base["seconds"] if base["seconds"] else float("inf")
+        regressed = (
+            ratio > 1 + threshold
+            and cur["seconds"] - base["seconds"] > MIN_REGRESSION_DELTA
+        )
+        mark = "  ← 回退" if regressed else ""
+        print(f"{name:<44}{base['seconds']:>10.4f}{cur['seconds']:>10.4f}{ratio:>8.2f}{mark}")
+        if regressed:
+            regressions.append((name, base["seconds"], cur["seconds"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="herchar 管线基准测试",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("-k", dest="keyword", help="只运行名称含该子串的基准")
+    parser.add_argument("--repeat", type=int, default=3, help="每项计时次数，取最小值（默认 3）")
+    parser.add_argument("--scale", type=int, default=0, metavar="N",
+                        help="追加 Ext-B 复制 N 份的合成语料基准")
+    parser.add_argument("--output", default=RESULTS_FILE, help=f"结果文件（默认 {RESULTS_FILE}）")
+    parser.add_argument("--baseline", help="与该基线文件比较")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="判定回退的相对阈值（默认 0.2，即慢 20%%）")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help=f"同时把结果写入 {BASELINE_FILE}")
+    args = parser.parse_args()
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    with tempfile.TemporaryDirectory(prefix="herchar-bench-") as workdir:
+        os.symlink(os.path.join(repo, build.RAW_DATA_DIR), os.path.join(workdir, build.RAW_DATA_DIR))
+        if os.path.exists(os.path.join(repo, build.PINYIN_TABLE_FILE)):
+            shutil.copy(os.path.join(repo, build.PINYIN_TABLE_FILE), workdir)
+        os.chdir(workdir)
+
+        benchmarks = list(BENCHMARKS)
+        if args.scale > 1:
+            benchmarks += _scaled_benchmarks(args.scale, workdir)
+        if args.keyword:
+            benchmarks = [b for b in benchmarks if args.keyword in b[0]]
+
+        fx = Fixtures()
+        # 预热语料缓存，使 load_ids_records.cached 测的是缓存命中
+        for f in fx.raw_files:
+            build.load_ids_records(f)
+
+        results = {}
+        for name, prepare, run in benchmarks:
+            results[name] = measure(prepare, run, fx, args.repeat)
+            r = results[name]
+            print(f"  {name:<44}{r['seconds']:>9.4f}s{r['peak_mb']:>10.2f} MB")
+        os.chdir(repo)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    build.save_json(report, output)
+    print(f"\n结果已写入 {output}")
+    if args.save_baseline:
+        build.save_json(report, os.path.join(repo, BASELINE_FILE))
+        print(f"基线已写入 {BASELINE_FILE}")
+
+    if baseline_path:
+        regressions = compare(results, build.load_json(baseline_path)["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 项基准回退超过 {args.threshold:.0%}")
+            sys.exit(1)
+        print("\n无回退。")
+
+
+if __name__ == "__main__":
+    main()
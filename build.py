@@ -2,24 +2,73 @@
 build.py — herchar 数据管线唯一入口
 
 用法:
-    python build.py              # 全流程（nyu → basic → mapping → web）
+    python build.py              # 增量全流程（nyu → basic → mapping → web → glyphs），跳过未变化的阶段
+    python build.py --force      # 忽略构建记录，全部重建
+    python build.py --dry-run    # 列出将要重建的阶段及原因
     python build.py --stage nyu      # 仅生成 nyu_hanzi.json
     python build.py --stage basic    # 仅生成 all_basic_hanzi.json
     python build.py --stage mapping  # 仅更新 mapping.json（需先有 nyu 和 basic）
-    python build.py --stage web      # 仅生成 web_mapping*.json（需先有 mapping 和 basic）
+    python build.py --stage web      # 仅生成 web_mapping*.json、web_shards/ 与反向索引 web_reverse.bin（需先有 mapping）
+    python build.py --stage glyphs   # 从 glyph_cache/ 打包缺字 SVG 为 glyphs.bin（需先有 web）
+    python build.py --stage index    # 生成全语料部件倒排索引 component_index.bin（见 component_index.py）
+    python build.py --stage decompose  # 把全部字递归拆到叶部件，生成 ids_leaves.json（见 decompose.py）
+    python build.py --stage fonts    # 读取 fonts/ 下字体的 cmap，生成覆盖位图 font_coverage.bin；
+                                     # 之后 web 阶段按可渲染性排序并生成缺字表 missing_glyphs.json
+    python build.py --deep-ids       # mapping 追加递归拆分匹配（先运行 decompose）
+    python build.py --similarity jaccard  # mapping 追加部件相似度匹配（需 numpy、scipy）
+    python build.py --provenance     # mapping 同时记录各字的来源，写入 mapping_provenance.bin
+    python build.py --rank tier --provenance  # 候选字按匹配级别排序（另有 default、frequency）
+    python build.py --raw-manifest   # 换入新的 CHISE 快照后重新生成 raw_data/MANIFEST.json
+    python build.py --update-pinyin-table  # 把 build_cache/ 中补算的拼音并入 pinyin_table.json
+    python build.py --jobs 8         # nyu 阶段用 8 个进程并行解析 raw_data
+    python build.py --no-intermediates  # 全程内存传递，只写出 web_mapping*.json（总是全部重建）
+    python build.py --force --profile --metrics-out report.json  # 各阶段耗时、内存与命中数
+    python build.py --targets 女,子,木  # 一次解析语料，为多个目标部件分别生成映射
+                                       # （女 沿用原文件名，其余为 mapping_子.json 等）
+
+raw_data 中的 IDS 文件可以是 .txt 或压缩的 .txt.gz / .txt.xz / .txt.zst（后者需
+zstandard），逐行流式解压读取；raw_data/MANIFEST.json 记录各文件哈希与行数，解析时核对。
+解析后的 raw_data 记录按文件内容哈希缓存于 build_cache/，原始文件未变时
+各阶段直接读取缓存，不再逐行解析；文件哈希按大小与修改时间缓存，未改动的文件不再重读。mapping 阶段所需拼音取自仓库附带的
+pinyin_table.json，表已覆盖全部用字时无需 pypinyin；表外的字由 pypinyin 补算后缓存于
+build_cache/pinyin_table.json（其余目标部件为 pinyin_table_子.json 等；
+--update-pinyin-table 把它们并入附带的表）。各阶段输入、输出
+与代码的哈希记录在 build_manifest.json，只重建发生变化的阶段及其下游。
 
 依赖:
     pip install pypinyin
+    pip install numpy scipy   # 可选，仅 --similarity 需要
+    pip install fonttools brotli  # 可选，仅 --stage fonts 需要
+    pip install zstandard     # 可选，仅 raw_data 含 .zst 文件时需要
 """
 
 import argparse
 import collections
 import glob
+import gzip
+import hashlib
+import importlib.metadata
+import inspect
+import io
 import json
+import lzma
+import mmap
 import os
 import re
+import struct
 import sys
-
+import time
+import tracemalloc
+
+import candidates_bin
+import component_index
+import font_coverage
+import glyph_bundle
+import provenance
+import reverse_index
+import similarity
+from decompose import DECOMPOSITION_FILE, Decomposer
+from mapping_bin import save_mapping_bin
 from utils import (
     IDC_REGEX,
     extract_single_component,
@@ -30,12 +79,40 @@ from utils import (
 # ──────────────────────────────────────────────
 # 文件路径常量
 # ──────────────────────────────────────────────
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
 RAW_DATA_DIR = "raw_data"
 NYU_HANZI_FILE = "nyu_hanzi.json"
 ALL_BASIC_HANZI_FILE = "all_basic_hanzi.json"
 MAPPING_FILE = "mapping.json"
 WEB_MAPPING_FILE = "web_mapping.json"
 WEB_MAPPING_LESS_FILE = "web_mapping_less.json"
+WEB_MAPPING_BIN_FILE = "web_mapping.bin"
+WEB_SHARD_DIR = "web_shards"
+BASIC_IDS_FILE = os.path.join(RAW_DATA_DIR, "IDS-UCS-Basic.txt")
+PINYIN_TABLE_FILE = "pinyin_table.json"
+RAW_MANIFEST_FILE = os.path.join(RAW_DATA_DIR, "MANIFEST.json")
+CORPUS_CACHE_DIR = "build_cache"
+FILE_DIGEST_CACHE = os.path.join(CORPUS_CACHE_DIR, "file_digests.json")
+# 仓库附带的拼音表只读；表外的字与 pypinyin 版本变化后重算的读音写在这里
+PINYIN_CACHE_FILE = os.path.join(CORPUS_CACHE_DIR, "pinyin_table.json")
+BUILD_MANIFEST_FILE = "build_manifest.json"
+FONT_DIR = "fonts"
+FONT_COVERAGE_FILE = "font_coverage.bin"
+MISSING_GLYPHS_FILE = "missing_glyphs.json"
+GLYPH_CACHE_DIR = "glyph_cache"
+GLYPH_BUNDLE_FILE = "glyphs.bin"
+CHAR_FREQ_FILE = "char_freq.txt"
+
+# 目标部件。默认「女」沿用上面的文件名，其他目标在文件名后加 _<部件>
+DEFAULT_TARGET = "女"
+
+
+def target_file(path, target):
+    """目标部件对应的产物路径，如 mapping.json → mapping_子.json。"""
+    if target == DEFAULT_TARGET:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_{target}{ext}"
 
 
 # ──────────────────────────────────────────────
@@ -55,11 +132,47 @@ def save_json(data, path, compact=False):
             json.dump(data, f, ensure_ascii=False, indent=4, sort_keys=True)
 
 
-def parse_ids_file(filepath):
-    """解析单个 IDS .txt 文件，返回 { char: {Codepoint, IDS, IDS_apparent} } 字典。"""
+# raw_data 可放未压缩或压缩的 IDS 文本；同名文件有多个版本时取靠前的后缀
+RAW_SUFFIXES = (".txt", ".txt.gz", ".txt.xz", ".txt.zst")
+
+
+def raw_name(filepath):
+    """去掉压缩后缀的文件名，如 IDS-UCS-Basic.txt.xz → IDS-UCS-Basic.txt。"""
+    name = os.path.basename(filepath)
+    for suffix in (".gz", ".xz", ".zst"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def open_ids_text(filepath):
+    """按扩展名打开 IDS 文本，压缩文件逐块流式解压，不先解压到磁盘。"""
+    if filepath.endswith(".gz"):
+        return gzip.open(filepath, "rt", encoding="utf-8")
+    if filepath.endswith(".xz"):
+        return lzma.open(filepath, "rt", encoding="utf-8")
+    if filepath.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            sys.exit(f"错误：读取 {filepath} 需要 zstandard（pip install zstandard）")
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(filepath, "rb"), read_across_frames=True, closefd=True
+        )
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(filepath, "r", encoding="utf-8")
+
+
+def parse_ids_file(filepath, stats=None):
+    """解析单个 IDS 文件（可压缩），返回 { char: {Codepoint, IDS, IDS_apparent} } 字典。
+
+    传入 stats（dict）时写入 stats["lines"]：解压后的总行数。
+    """
     records = {}
-    with open(filepath, "r", encoding="utf-8") as f:
+    lines = 0
+    with open_ids_text(filepath) as f:
         for line in f:
+            lines += 1
             line = line.strip()
             if line.startswith(";;") or not line:
                 continue
@@ -79,132 +192,497 @@ def parse_ids_file(filepath):
                 "IDS": ids,
                 "IDS_apparent": ids_apparent,
             }
+    if stats is not None:
+        stats["lines"] = lines
     return records
 
 
 # ──────────────────────────────────────────────
-# Stage 1: 生成 nyu_hanzi.json
+# 语料模型：阶段间在内存中传递的汉字记录
 # ──────────────────────────────────────────────
 
-def stage_nyu():
-    print("=== Stage: nyu_hanzi ===")
-    input_files = sorted(glob.glob(os.path.join(RAW_DATA_DIR, "*.txt")))
-    if not input_files:
-        sys.exit(f"错误：在 {RAW_DATA_DIR} 中找不到 .txt 文件")
+class HanziRecord:
+    """单个汉字的 IDS 记录。部件以驻留字符串组成的元组保存。
 
-    nyu_hanzi = {}
-    for filepath in input_files:
-        print(f"  处理: {os.path.basename(filepath)}")
-        for char, info in parse_ids_file(filepath).items():
-            if char in nyu_hanzi:
-                continue
-            ids, ids_apparent = info["IDS"], info["IDS_apparent"]
-            if "女" not in ids and "女" not in ids_apparent:
-                continue
-            nyu_hanzi[char] = {
-                "Codepoint": info["Codepoint"],
-                "IDS": ids,
-                "IDS_components": get_ids_components_list(ids, remove_char="女"),
-                "IDS_apparent": ids_apparent,
-                "IDS_apparent_components": get_ids_components_list(
-                    ids_apparent, remove_char="女"
-                ),
-            }
+    JSON 中间文件的字段名见 to_json / from_json。
+    """
+
+    __slots__ = (
+        "codepoint",
+        "ids",
+        "ids_components",
+        "ids_apparent",
+        "ids_apparent_components",
+    )
+
+    def __init__(self, codepoint, ids, ids_components, ids_apparent, ids_apparent_components):
+        self.codepoint = codepoint
+        self.ids = ids
+        self.ids_components = ids_components
+        self.ids_apparent = ids_apparent
+        self.ids_apparent_components = ids_apparent_components
+
+    @classmethod
+    def from_ids(cls, codepoint, ids, ids_apparent, remove_char=None):
+        return cls(
+            codepoint,
+            ids,
+            tuple(get_ids_components_list(ids, remove_char=remove_char)),
+            ids_apparent,
+            tuple(get_ids_components_list(ids_apparent, remove_char=remove_char)),
+        )
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            data["Codepoint"],
+            data["IDS"],
+            tuple(data["IDS_components"]),
+            data["IDS_apparent"],
+            tuple(data["IDS_apparent_components"]),
+        )
+
+    def to_json(self):
+        return {
+            "Codepoint": self.codepoint,
+            "IDS": self.ids,
+            "IDS_components": list(self.ids_components),
+            "IDS_apparent": self.ids_apparent,
+            "IDS_apparent_components": list(self.ids_apparent_components),
+        }
+
+    @property
+    def component_keys(self):
+        """用于整体匹配的非空部件元组（IDS 与 IDS_apparent 各一）。"""
+        return [t for t in (self.ids_components, self.ids_apparent_components) if t]
+
+
+def load_records(path):
+    return {char: HanziRecord.from_json(d) for char, d in load_json(path).items()}
+
+
+def save_records(records, path):
+    save_json({char: rec.to_json() for char, rec in records.items()}, path)
+
+
+def shared(ctx):
+    """多目标构建间共享的解析结果与索引（与目标部件无关）。"""
+    return ctx.setdefault("shared", {})
 
-    save_json(nyu_hanzi, NYU_HANZI_FILE)
-    print(f"生成 {NYU_HANZI_FILE}：{len(nyu_hanzi)} 个含「女」的汉字\n")
+
+def record_metrics(ctx, **values):
+    """记录当前阶段的计数（记录数、索引大小、各级命中数等），供 --profile 报告使用。"""
+    metrics = ctx.get("metrics")
+    if metrics is not None:
+        metrics.setdefault(ctx["stage_key"], {}).update(values)
+
+
+def save_intermediate(ctx, data, path, records=False):
+    """中间产物在全流程中经 ctx 直接传递，落盘只是可选的副产物。"""
+    if not ctx.get("write_intermediates", True):
+        print(f"  （未写出 {path}）")
+        return
+    if records:
+        save_records(data, path)
+    else:
+        save_json(data, path)
 
 
 # ──────────────────────────────────────────────
-# Stage 2: 生成 all_basic_hanzi.json
+# 语料缓存：已解析的 IDS 记录按原始文件内容哈希落盘
 # ──────────────────────────────────────────────
+#
+# 文件格式（小端）：
+#   magic "HCIDS\x01" | u32 记录数 | u32 数据长度 | 数据
+# 数据为 UTF-8 字符串，每条记录 4 个字段（Codepoint, 字, IDS, IDS_apparent），
+# 字段间以 \0 分隔。IDS 数据中不会出现 \0，读取时只需一次 decode + split。
 
-def stage_basic():
-    print("=== Stage: all_basic_hanzi ===")
-    input_file = os.path.join(RAW_DATA_DIR, "IDS-UCS-Basic.txt")
-    if not os.path.exists(input_file):
-        sys.exit(f"错误：找不到 {input_file}")
+CORPUS_CACHE_MAGIC = b"HCIDS\x01"
+_CORPUS_CACHE_HEADER = struct.Struct("<II")
 
-    nyu_keys = set()
-    if os.path.exists(NYU_HANZI_FILE):
-        nyu_keys = set(load_json(NYU_HANZI_FILE).keys())
 
-    all_basic = {}
-    for char, info in parse_ids_file(input_file).items():
-        if char in nyu_keys:
-            continue
-        ids, ids_apparent = info["IDS"], info["IDS_apparent"]
-        all_basic[char] = {
-            "Codepoint": info["Codepoint"],
-            "IDS": ids,
-            "IDS_components": get_ids_components_list(ids),
-            "IDS_apparent": ids_apparent,
-            "IDS_apparent_components": get_ids_components_list(ids_apparent),
-        }
+# 文件哈希按 (大小, 修改时间) 缓存：stat 未变的文件不再重读，增量判断只需 stat。
+# 进程内缓存，由 save_digest_cache 落盘；并行解析的子进程不写回。
+_digest_cache = None
+
+
+def _load_digest_cache():
+    global _digest_cache
+    if _digest_cache is None:
+        _digest_cache = {}
+        if os.path.exists(FILE_DIGEST_CACHE):
+            try:
+                _digest_cache = load_json(FILE_DIGEST_CACHE)
+            except ValueError:
+                pass
+    return _digest_cache
+
+
+def save_digest_cache():
+    if not _digest_cache:
+        return
+    os.makedirs(CORPUS_CACHE_DIR, exist_ok=True)
+    tmp = FILE_DIGEST_CACHE + ".tmp"
+    save_json(_digest_cache, tmp, compact=True)
+    os.replace(tmp, FILE_DIGEST_CACHE)
+
+
+def file_digest(path):
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    cache = _load_digest_cache()
+    entry = cache.get(key)
+    if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+        return entry[2]
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    cache[key] = [st.st_size, st.st_mtime_ns, digest]
+    return digest
 
-    save_json(all_basic, ALL_BASIC_HANZI_FILE)
-    print(f"生成 {ALL_BASIC_HANZI_FILE}：{len(all_basic)} 个基础汉字\n")
+
+def _corpus_cache_path(filepath, digest):
+    return os.path.join(CORPUS_CACHE_DIR, f"{raw_name(filepath)}.{digest[:16]}.idsc")
 
 
 # ──────────────────────────────────────────────
-# Stage 3: 生成/更新 mapping.json
+# raw_data 校验清单：各文件的哈希与解压后行数
 # ──────────────────────────────────────────────
+#
+# raw_data/MANIFEST.json 形如 { "IDS-UCS-Basic.txt": {"file", "sha1", "lines"} }，
+# 键为去掉压缩后缀的文件名，file 为实际存放的文件名。由 --raw-manifest 生成；
+# 换入新的 CHISE 快照后重新生成并一同提交。
+# 解析原始文件时核对哈希与行数，不一致即报错（文件损坏、截断或清单过期）。
 
-def _get_component_tuple(data, key):
-    comps = data.get(key)
-    if not comps:
+def load_raw_manifest():
+    return load_json(RAW_MANIFEST_FILE) if os.path.exists(RAW_MANIFEST_FILE) else {}
+
+
+def _check_raw_manifest(filepath, digest, lines=None):
+    entry = load_raw_manifest().get(raw_name(filepath))
+    if entry is None:
+        return
+    # 哈希针对实际存放的文件；换成压缩版本后仍可核对解压后的行数
+    if entry["file"] == os.path.basename(filepath) and entry["sha1"] != digest:
+        sys.exit(f"错误：{filepath} 的哈希与 {RAW_MANIFEST_FILE} 不符"
+                 f"（更新语料后请运行 python build.py --raw-manifest）")
+    if lines is not None and entry["lines"] != lines:
+        sys.exit(f"错误：{filepath} 解压后 {lines} 行，{RAW_MANIFEST_FILE} 记录为 {entry['lines']} 行")
+
+
+def write_raw_manifest():
+    """为 raw_data 当前的全部文件重新生成 MANIFEST.json。"""
+    manifest = {}
+    for filepath in _raw_data_files():
+        stats = {}
+        parse_ids_file(filepath, stats)
+        manifest[raw_name(filepath)] = {
+            "file": os.path.basename(filepath),
+            "sha1": file_digest(filepath),
+            "lines": stats["lines"],
+        }
+        print(f"  {os.path.basename(filepath)}: {stats['lines']} 行")
+    save_json(manifest, RAW_MANIFEST_FILE)
+    print(f"生成 {RAW_MANIFEST_FILE}：{len(manifest)} 个文件")
+
+
+def _write_corpus_cache(path, records):
+    fields = []
+    for char, info in records.items():
+        fields += (info["Codepoint"], char, info["IDS"], info["IDS_apparent"])
+    blob = "\0".join(fields).encode("utf-8")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(CORPUS_CACHE_MAGIC)
+        f.write(_CORPUS_CACHE_HEADER.pack(len(records), len(blob)))
+        f.write(blob)
+    os.replace(tmp, path)
+
+
+def _read_corpus_cache(path):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = len(CORPUS_CACHE_MAGIC)
+        if mm[:start] != CORPUS_CACHE_MAGIC:
+            return None
+        count, size = _CORPUS_CACHE_HEADER.unpack_from(mm, start)
+        start += _CORPUS_CACHE_HEADER.size
+        blob = mm[start:start + size].decode("utf-8")
+    fields = blob.split("\0") if count else []
+    if len(fields) != count * 4:
         return None
-    return tuple(comps)
+    records = {}
+    for i in range(0, len(fields), 4):
+        records[fields[i + 1]] = {
+            "Codepoint": fields[i],
+            "IDS": fields[i + 2],
+            "IDS_apparent": fields[i + 3],
+        }
+    return records
 
 
-def stage_mapping():
-    print("=== Stage: mapping ===")
+def load_ids_records(filepath):
+    """与 parse_ids_file 返回相同结构，但优先读取按内容哈希命名的语料缓存。
 
-    for f in [ALL_BASIC_HANZI_FILE, NYU_HANZI_FILE]:
-        if not os.path.exists(f):
-            sys.exit(f"错误：缺少 {f}，请先运行 --stage basic/nyu")
+    缓存未命中时解析原始文件并写入缓存，同时清理同名文件的旧版本缓存
+    （压缩与未压缩的同名文件共用缓存名）。有 raw_data/MANIFEST.json 时核对哈希，
+    解析时另核对行数。
+    """
+    digest = file_digest(filepath)
+    _check_raw_manifest(filepath, digest)
+    cache_path = _corpus_cache_path(filepath, digest)
+    if os.path.exists(cache_path):
+        records = _read_corpus_cache(cache_path)
+        if records is not None:
+            return records
+
+    stats = {}
+    records = parse_ids_file(filepath, stats)
+    _check_raw_manifest(filepath, digest, stats["lines"])
+    os.makedirs(CORPUS_CACHE_DIR, exist_ok=True)
+    stale = glob.glob(os.path.join(
+        CORPUS_CACHE_DIR, glob.escape(raw_name(filepath)) + ".*.idsc"
+    ))
+    for old in stale:
+        if old != cache_path:
+            os.remove(old)
+    _write_corpus_cache(cache_path, records)
+    return records
 
-    basic_hanzi = load_json(ALL_BASIC_HANZI_FILE)
-    nyu_hanzi = load_json(NYU_HANZI_FILE)
 
-    # 从零构建，保证结果是 raw_data 的确定性函数（mapping.json 为可重建中间产物）
-    buffer = collections.defaultdict(set)
+# ──────────────────────────────────────────────
+# Stage 1: 生成 nyu_hanzi.json
+# ──────────────────────────────────────────────
+
+def _select_target_records(records, target):
+    """从单个文件的记录中挑出含目标部件的字，返回 [(字, HanziRecord), ...]。"""
+    entries = []
+    for char, info in records.items():
+        ids, ids_apparent = info["IDS"], info["IDS_apparent"]
+        if target not in ids and target not in ids_apparent:
+            continue
+        entries.append((char, HanziRecord.from_ids(
+            info["Codepoint"], ids, ids_apparent, remove_char=target
+        )))
+    return entries
 
-    # 构建 basic 汉字组件倒排索引
-    print("  构建部件倒排索引...")
-    basic_ids_lookup = collections.defaultdict(set)
-    for char, data in basic_hanzi.items():
-        for key in ("IDS_components", "IDS_apparent_components"):
-            t = _get_component_tuple(data, key)
-            if t:
-                basic_ids_lookup[t].add(char)
 
-    # 遍历 nyu_hanzi 进行匹配
-    print("  匹配含「女」汉字...")
-    single_count = match_count = 0
+def _ingest_nyu_file(filepath, target=DEFAULT_TARGET):
+    """解析单个原始文件并切分部件，返回 (文件记录数, 含目标部件的 [(字, 记录), ...])。
+
+    保持文件内记录顺序；顶层函数以便在进程池中调用。
+    """
+    records = load_ids_records(filepath)
+    return len(records), _select_target_records(records, target)
+
+
+def _raw_records(ctx, filepath):
+    """同一进程内每个原始文件只读取一次，供多个目标部件复用。"""
+    cache = shared(ctx).setdefault("raw_records", {})
+    if filepath not in cache:
+        cache[filepath] = load_ids_records(filepath)
+    return cache[filepath]
+
+
+def stage_nyu(ctx, jobs=1):
+    target = ctx.get("target", DEFAULT_TARGET)
+    out_file = target_file(NYU_HANZI_FILE, target)
+    print(f"=== Stage: nyu_hanzi [{target}] ===")
+    input_files = _raw_data_files()
+    if not input_files:
+        sys.exit(f"错误：在 {RAW_DATA_DIR} 中找不到 IDS 文件")
+
+    cached = "raw_records" in shared(ctx)
+    if jobs > 1 and not cached:
+        from concurrent.futures import ProcessPoolExecutor
+
+        print(f"  并行解析 {len(input_files)} 个文件（{jobs} 进程）")
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # map 按提交顺序返回结果，合并顺序与串行一致
+            results = list(pool.map(
+                _ingest_nyu_file, input_files, [target] * len(input_files)
+            ))
+        parsed = sum(n for n, _ in results)
+        per_file = [entries for _, entries in results]
+    else:
+        parsed = 0
+        per_file = []
+        for filepath in input_files:
+            if not cached:
+                print(f"  处理: {os.path.basename(filepath)}")
+            records = _raw_records(ctx, filepath)
+            parsed += len(records)
+            per_file.append(_select_target_records(records, target))
+
+    # 按 glob 排序合并，同一字先出现的文件优先
+    nyu_hanzi = {}
+    for entries in per_file:
+        for char, record in entries:
+            if char not in nyu_hanzi:
+                nyu_hanzi[char] = record
+
+    # 与 JSON 中间文件（sort_keys）保持相同的键序：下游推断结果依赖遍历顺序
+    nyu_hanzi = dict(sorted(nyu_hanzi.items()))
+    ctx["nyu"] = nyu_hanzi
+    record_metrics(
+        ctx,
+        files=len(input_files),
+        records_parsed=parsed,
+        nyu_hanzi=len(nyu_hanzi),
+    )
+    save_intermediate(ctx, nyu_hanzi, out_file, records=True)
+    print(f"生成 {out_file}：{len(nyu_hanzi)} 个含「{target}」的汉字\n")
+
+
+# ──────────────────────────────────────────────
+# Stage 2: 生成 all_basic_hanzi.json
+# ──────────────────────────────────────────────
+
+def _basic_records(ctx):
+    """IDS-UCS-Basic 中全部字的记录（不剔除任何目标部件），按字排序，跨目标共享。"""
+    cache = shared(ctx)
+    if "basic_records" not in cache:
+        records = {
+            char: HanziRecord.from_ids(info["Codepoint"], info["IDS"], info["IDS_apparent"])
+            for char, info in _raw_records(ctx, basic_ids_file()).items()
+        }
+        cache["basic_records"] = dict(sorted(records.items()))
+    return cache["basic_records"]
+
+
+def stage_basic(ctx):
+    target = ctx.get("target", DEFAULT_TARGET)
+    nyu_file = target_file(NYU_HANZI_FILE, target)
+    out_file = target_file(ALL_BASIC_HANZI_FILE, target)
+    print(f"=== Stage: all_basic_hanzi [{target}] ===")
+    if not os.path.exists(basic_ids_file()):
+        sys.exit(f"错误：找不到 {BASIC_IDS_FILE}（或其压缩版本）")
+
+    nyu_keys = set()
+    if "nyu" in ctx:
+        nyu_keys = set(ctx["nyu"])
+    elif os.path.exists(nyu_file):
+        nyu_keys = set(load_json(nyu_file).keys())
+
+    all_basic = {
+        char: rec
+        for char, rec in _basic_records(ctx).items()
+        if char not in nyu_keys
+    }
+
+    ctx["basic"] = all_basic
+    record_metrics(ctx, basic_records=len(_basic_records(ctx)), all_basic_hanzi=len(all_basic))
+    save_intermediate(ctx, all_basic, out_file, records=True)
+    print(f"生成 {out_file}：{len(all_basic)} 个基础汉字\n")
+
+
+# ──────────────────────────────────────────────
+# Stage 3: 生成/更新 mapping.json
+# ──────────────────────────────────────────────
+
+def _basic_ids_lookup(ctx):
+    """IDS-UCS-Basic 全部字的部件整体倒排索引 { 部件元组: {字, ...} }，跨目标共享。
+
+    索引覆盖所有基础字，不在当前目标 basic 集合中的命中会在生成 final 时被过滤。
+    """
+    cache = shared(ctx)
+    if "basic_ids_lookup" not in cache:
+        print("  构建部件倒排索引...")
+        lookup = collections.defaultdict(set)
+        for char, data in _basic_records(ctx).items():
+            for t in data.component_keys:
+                lookup[t].add(char)
+        cache["basic_ids_lookup"] = lookup
+    return cache["basic_ids_lookup"]
+
+
+def _shared_leaves(ctx):
+    """递归拆分结果（decompose 阶段写入 ctx 或 ids_leaves.json），跨目标共享。"""
+    cache = shared(ctx)
+    if "leaves" not in cache:
+        if not os.path.exists(DECOMPOSITION_FILE):
+            sys.exit(f"错误：缺少 {DECOMPOSITION_FILE}，请先运行 --stage decompose")
+        cache["leaves"] = load_leaves()
+    return cache["leaves"][1]
+
+
+def _leaf_key(leaves):
+    """叶部件多重集的规范形式（排序后的元组），用于忽略部件位置的等价匹配。"""
+    return tuple(sorted(leaves))
+
+
+def _basic_leaf_lookup(ctx):
+    """IDS-UCS-Basic 全部字的 { 叶部件多重集: {字, ...} }，跨目标共享。"""
+    cache = shared(ctx)
+    if "basic_leaf_lookup" not in cache:
+        leaves = _shared_leaves(ctx)
+        lookup = collections.defaultdict(set)
+        for char in _basic_records(ctx):
+            lookup[_leaf_key(leaves.get(char, (char,)))].add(char)
+        cache["basic_leaf_lookup"] = lookup
+    return cache["basic_leaf_lookup"]
+
+
+def _structural_match(basic_hanzi, nyu_hanzi, basic_ids_lookup, target=DEFAULT_TARGET,
+                      leaves=None, leaf_lookup=None, prov=None):
+    """结构匹配：单部件提取 + 部件整体匹配（+ 可选的递归拆分匹配）。
+
+    传入 leaves/leaf_lookup 时，前两种方法都未命中的字再按叶部件多重集匹配：
+    去掉目标部件的叶部件后，与某基础字的叶部件完全相同即视为匹配。
+    传入 prov（provenance.ProvenanceLog）时记录每次命中的级别与依据。
+
+    返回 (final, 单部件命中数, 整体匹配命中数, 递归拆分命中数)；final 以每个
+    基础汉字为键，无结构匹配者值为空串。
+    """
+    # 从零构建，保证结果是 raw_data 的确定性函数（mapping.json 为可重建中间产物）
+    buffer = collections.defaultdict(set)
+    single_count = match_count = deep_count = 0
+    target_leaves = collections.Counter(leaves.get(target, (target,))) if leaves else None
 
     for hanzi, data in nyu_hanzi.items():
         # A. 单部件提取法
-        comp = extract_single_component(data.get("IDS", ""))
+        comp = extract_single_component(data.ids, target)
         if not comp:
-            comp = extract_single_component(data.get("IDS_apparent", ""))
+            comp = extract_single_component(data.ids_apparent, target)
         if comp:
             buffer[comp].add(hanzi)
             single_count += 1
+            if prov is not None:
+                prov.add(comp, "single", "", hanzi)
             continue
 
         # B. 部件整体匹配法
         matched = set()
-        for key in ("IDS_components", "IDS_apparent_components"):
-            t = _get_component_tuple(data, key)
-            if t and t in basic_ids_lookup:
+        for t in data.component_keys:
+            if t in basic_ids_lookup:
                 matched.update(basic_ids_lookup[t])
         if matched:
             match_count += 1
-            for target in matched:
-                buffer[target].add(hanzi)
+            for basic_char in matched:
+                buffer[basic_char].add(hanzi)
+            if prov is not None:
+                for t in data.component_keys:
+                    for basic_char in basic_ids_lookup.get(t, ()):
+                        prov.add(basic_char, "whole", t, hanzi)
+            continue
 
-    # 转回普通 dict，只保留基础汉字键（all_basic 已排除含「女」字）
+        # C. 递归拆分匹配法
+        if leaf_lookup is None:
+            continue
+        rest = collections.Counter(leaves.get(hanzi, (hanzi,)))
+        if any(rest[c] < n for c, n in target_leaves.items()):
+            continue
+        rest.subtract(target_leaves)
+        key = _leaf_key(rest.elements())
+        if key and key in leaf_lookup:
+            deep_count += 1
+            for basic_char in leaf_lookup[key]:
+                buffer[basic_char].add(hanzi)
+                if prov is not None:
+                    prov.add(basic_char, "deep", key, hanzi)
+
+    # 转回普通 dict，只保留基础汉字键（all_basic 已排除含目标部件的字）
     basic_keys = set(basic_hanzi.keys())
     final = {
         k: "".join(sorted(v))
@@ -214,66 +692,237 @@ def stage_mapping():
     # 确保每个基础汉字都是键（暂可为空，后续由推断/兜底填充）
     for k in basic_keys:
         final.setdefault(k, "")
+    return final, single_count, match_count, deep_count
+
+
+def stage_mapping(ctx, deep_ids=False, similarity_metric=None, provenance_log=False):
+    target = ctx.get("target", DEFAULT_TARGET)
+    basic_file = target_file(ALL_BASIC_HANZI_FILE, target)
+    nyu_file = target_file(NYU_HANZI_FILE, target)
+    out_file = target_file(MAPPING_FILE, target)
+    prov_file = target_file(provenance.PROVENANCE_FILE, target)
+    print(f"=== Stage: mapping [{target}] ===")
+
+    for key, f in [("basic", basic_file), ("nyu", nyu_file)]:
+        if key not in ctx and not os.path.exists(f):
+            sys.exit(f"错误：缺少 {f}，请先运行 --stage basic/nyu")
 
+    basic_hanzi = ctx.get("basic") or load_records(basic_file)
+    nyu_hanzi = ctx.get("nyu") or load_records(nyu_file)
+
+    basic_ids_lookup = _basic_ids_lookup(ctx)
+    leaves = leaf_lookup = None
+    if deep_ids:
+        leaves = _shared_leaves(ctx)
+        leaf_lookup = _basic_leaf_lookup(ctx)
+
+    # 来源记录（可选）：各级命中的依据，写入列式文件 mapping_provenance.bin
+    prov = provenance.ProvenanceLog() if provenance_log else None
+
+    # 遍历 nyu_hanzi 进行匹配
+    print(f"  匹配含「{target}」汉字...")
+    final, single_count, match_count, deep_count = _structural_match(
+        basic_hanzi, nyu_hanzi, basic_ids_lookup, target, leaves, leaf_lookup, prov
+    )
+
+    structural_hits = sum(1 for v in final.values() if v)
     print(
         f"  单部件匹配: {single_count}  组件整体匹配: {match_count}  "
-        f"结构匹配: {sum(1 for v in final.values() if v)} / {len(final)}"
+        + (f"递归拆分匹配: {deep_count}  " if deep_ids else "")
+        + f"结构匹配: {structural_hits} / {len(final)}"
     )
+    record_metrics(
+        ctx,
+        basic_ids_lookup=len(basic_ids_lookup),
+        single_component_hits=single_count,
+        whole_tuple_hits=match_count,
+        structural_mapped=structural_hits,
+    )
+    if deep_ids:
+        record_metrics(ctx, leaf_lookup=len(leaf_lookup), deep_ids_hits=deep_count)
 
-    # 1) 声旁/上下文推断（结构性，优先于拼音兜底）
-    _advanced_mapping(basic_hanzi, nyu_hanzi, final)
-
-    # 2) 同音字兜底：保证每个基础汉字至少有一个映射
-    _fill_by_pinyin(basic_hanzi, nyu_hanzi, final)
+    # 表外补算的拼音按目标部件分别缓存，一个目标新增的字不会让其余目标的构建记录失效
+    pinyin_chars = _pinyin_chars(basic_hanzi, nyu_hanzi, target)
+    py_table = load_pinyin_table(pinyin_chars, target_file(PINYIN_CACHE_FILE, target))
+    if py_table is not None:
+        record_metrics(ctx, pinyin_table_chars=len(pinyin_chars))
 
-    save_json(final, MAPPING_FILE)
+    # 1) 声旁/上下文推断（结构性，优先于拼音兜底）
+    record_metrics(ctx, **_advanced_mapping(basic_hanzi, nyu_hanzi, final, py_table, target, prov))
+
+    # 2) 部件相似度（可选）：仍无映射者按部件集合的相似度匹配
+    if similarity_metric:
+        record_metrics(ctx, **_similarity_mapping(
+            basic_hanzi, nyu_hanzi, final, similarity_metric, target, prov
+        ))
+
+    # 3) 同音字兜底：保证每个基础汉字至少有一个映射
+    record_metrics(ctx, **_fill_by_pinyin(basic_hanzi, nyu_hanzi, final, py_table, target, prov))
+
+    final = dict(sorted(final.items()))
+    ctx["mapping"] = final
+    save_intermediate(ctx, final, out_file)
+    if prov is not None:
+        # 结构匹配可能命中不在 basic 集合中的字，与 final 一样只保留基础汉字
+        size = prov.save(prov_file, keep=final)
+        record_metrics(ctx, provenance_events=len(prov))
+        print(f"生成 {prov_file}：{size} 字节")
+    elif os.path.exists(prov_file):
+        # 上次 --provenance 留下的记录对应旧的映射，删除以免 --rank tier 误用
+        os.remove(prov_file)
+        print(f"  删除过期的 {prov_file}")
     nonempty = sum(1 for v in final.values() if v)
     print(
-        f"生成 {MAPPING_FILE}：总键数 {len(final)}，"
+        f"生成 {out_file}：总键数 {len(final)}，"
         f"有映射 {nonempty}，空值 {len(final) - nonempty}\n"
     )
 
 
-def _fill_by_pinyin(basic_hanzi, nyu_hanzi, mapping):
-    """同音字兜底：为仍无映射的基础汉字按音近程度分级匹配含「女」汉字。
+# 拼音特征表：语料涉及的每个字在各拼音风格下的首个读音，一次批量计算后落盘
+PINYIN_STYLES = ("TONE3", "NORMAL", "FINALS", "FIRST_LETTER")
+
+
+def _pinyin_chars(basic_hanzi, nyu_hanzi, target=DEFAULT_TARGET):
+    """mapping 阶段需要查拼音的全部字：基础字、含目标部件的字及基础字的非实体部件。"""
+    chars = set(basic_hanzi) | set(nyu_hanzi)
+    for data in basic_hanzi.values():
+        for c in get_components_except_target_char(data.ids, target):
+            if not c.startswith("&"):
+                chars.add(c)
+    return chars
+
+
+def _read_pinyin_file(path, version):
+    """读取拼音表文件；不存在或与已安装的 pypinyin 版本不符时返回 None。"""
+    if not os.path.exists(path):
+        return None
+    data = load_json(path)
+    # pypinyin 版本变化时读音可能不同，整表作废；未安装时照用
+    if version is not None and data.get("pypinyin") != version:
+        return None
+    return data
+
+
+def load_pinyin_table(chars, cache_file=PINYIN_CACHE_FILE):
+    """返回 { 风格名: { 字: 读音 } }，覆盖 chars 中的每个字。
+
+    依次读取 PINYIN_TABLE_FILE 与 cache_file；仅对两者都缺失的字调用
+    pypinyin 批量计算，结果只写入 cache_file，仓库附带的表保持不变
+    （由 --update-pinyin-table 显式并入）。
+    表已完整覆盖时不再需要 pypinyin；缺字且 pypinyin 未安装时返回 None。
+    """
+    version = None
+    try:
+        import pypinyin
+        version = pypinyin.__version__
+    except ImportError:
+        pypinyin = None
+
+    styles = {s: {} for s in PINYIN_STYLES}
+    known = set()
+    cache = _read_pinyin_file(cache_file, version)
+    for data in (_read_pinyin_file(PINYIN_TABLE_FILE, version), cache):
+        if data is not None:
+            for name in PINYIN_STYLES:
+                styles[name].update(data["styles"][name])
+            known.update(data["chars"])
+
+    missing = sorted(chars - known)
+    if missing:
+        if pypinyin is None:
+            return None
+        print(f"  计算拼音特征表：{len(missing)} 个新字（写入 {cache_file}）")
+        if cache is None:
+            cache = {"pypinyin": version, "chars": "", "styles": {s: {} for s in PINYIN_STYLES}}
+        for name in PINYIN_STYLES:
+            style = getattr(pypinyin.Style, name)
+            # 列表输入逐项单独注音，不做分词，结果与逐字调用一致
+            results = pypinyin.pinyin(missing, heteronym=False, style=style)
+            for ch, res in zip(missing, results):
+                if res:
+                    styles[name][ch] = cache["styles"][name][ch] = res[0]
+        cache["chars"] = "".join(sorted(set(cache["chars"]) | set(missing)))
+        os.makedirs(CORPUS_CACHE_DIR, exist_ok=True)
+        save_json(cache, cache_file, compact=True)
+    return styles
+
+
+def _pinyin_cache_files():
+    """各目标部件的拼音缓存，如 build_cache/pinyin_table.json、pinyin_table_子.json。"""
+    stem, ext = os.path.splitext(PINYIN_CACHE_FILE)
+    return sorted(glob.glob(glob.escape(stem) + "*" + ext))
+
+
+def update_pinyin_table():
+    """把各目标部件缓存中补算的读音并入仓库附带的 PINYIN_TABLE_FILE，随后删除缓存。
+
+    缓存与附带的表记录的 pypinyin 版本不同时，缓存是按新版本重算的，以它替换整表。
+    """
+    caches = _pinyin_cache_files()
+    if not caches:
+        print(f"{CORPUS_CACHE_DIR}/ 中没有拼音缓存，{PINYIN_TABLE_FILE} 已是最新")
+        return
+    table = load_json(PINYIN_TABLE_FILE) if os.path.exists(PINYIN_TABLE_FILE) else None
+    added = set()
+    for path in caches:
+        cache = load_json(path)
+        if table is None or table.get("pypinyin") != cache.get("pypinyin"):
+            print(f"  pypinyin 版本不同（{table and table.get('pypinyin')} → {cache.get('pypinyin')}），"
+                  f"以 {path} 替换整表")
+            table = {"pypinyin": cache.get("pypinyin"), "chars": "", "styles": {s: {} for s in PINYIN_STYLES}}
+        for name in PINYIN_STYLES:
+            table["styles"][name].update(cache["styles"][name])
+        added.update(cache["chars"])
+        table["chars"] = "".join(sorted(set(table["chars"]) | set(cache["chars"])))
+    for name in PINYIN_STYLES:
+        column = table["styles"][name]
+        table["styles"][name] = {ch: column[ch] for ch in sorted(column)}
+    save_json(table, PINYIN_TABLE_FILE, compact=True)
+    for path in caches:
+        os.remove(path)
+    print(f"已把 {len(added)} 个字并入 {PINYIN_TABLE_FILE}（共 {len(table['chars'])} 个字）")
+
+
+def _fill_by_pinyin(basic_hanzi, nyu_hanzi, mapping, py_table, target=DEFAULT_TARGET, prov=None):
+    """同音字兜底：为仍无映射的基础汉字按音近程度分级匹配含目标部件（默认「女」）的汉字。
 
     分级（从强到弱，命中即停）：
       1. 声调精确同音（如 nü3 == nü3）
       2. 去声调同音节（如 ma == ma，不论声调）
       3. 同声母（如 b* 对 b*）
-      4. 常量兜底「女」（极生僻字、无同声母含女字时）
+      4. 常量兜底：目标部件本身（极生僻字、无同声母候选时）
     """
-    try:
-        from pypinyin import Style, pinyin
-    except ImportError:
-        print("  [跳过] pypinyin 未安装，跳过同音字兜底")
-        # 至少保证非空：用「女」兜底
+    if py_table is None:
+        print("  [跳过] pypinyin 未安装且拼音特征表不完整，跳过同音字兜底")
+        # 至少保证非空：用目标部件兜底
         filled = 0
         for char, val in mapping.items():
             if not val:
-                mapping[char] = "女"
+                mapping[char] = target
                 filled += 1
+                if prov is not None:
+                    prov.add(char, "const", "", target)
         print(f"  常量兜底填充: {filled} 个")
-        return
+        return {"pinyin_const_hits": filled}
 
     print("  构建拼音索引（同音字兜底）...")
 
-    def first_py(char, style):
-        res = pinyin(char, heteronym=False, style=style)
-        return res[0][0] if res and res[0] else None
+    py_tone = py_table["TONE3"]
+    py_plain = py_table["NORMAL"]
+    py_initial = py_table["FIRST_LETTER"]
 
-    # 以含「女」汉字为候选池，分别建三级索引
+    # 以含目标部件的汉字为候选池，分别建三级索引
     idx_tone = collections.defaultdict(set)   # 声调精确
     idx_plain = collections.defaultdict(set)  # 去声调同音节
     idx_initial = collections.defaultdict(set)  # 同声母
     for ch in nyu_hanzi:
-        t = first_py(ch, Style.TONE3)
+        t = py_tone.get(ch)
         if t:
             idx_tone[t].add(ch)
-        p = first_py(ch, Style.NORMAL)
+        p = py_plain.get(ch)
         if p:
             idx_plain[p].add(ch)
-        i = first_py(ch, Style.FIRST_LETTER)
+        i = py_initial.get(ch)
         if i:
             idx_initial[i].add(ch)
 
@@ -281,70 +930,76 @@ def _fill_by_pinyin(basic_hanzi, nyu_hanzi, mapping):
     for char, val in mapping.items():
         if val:
             continue
-        t = first_py(char, Style.TONE3)
+        t = py_tone.get(char)
         if t and idx_tone.get(t):
             mapping[char] = "".join(sorted(idx_tone[t]))
             t_cnt += 1
+            if prov is not None:
+                prov.add(char, "tone", t, mapping[char])
             continue
-        p = first_py(char, Style.NORMAL)
+        p = py_plain.get(char)
         if p and idx_plain.get(p):
             mapping[char] = "".join(sorted(idx_plain[p]))
             p_cnt += 1
+            if prov is not None:
+                prov.add(char, "plain", p, mapping[char])
             continue
-        i = first_py(char, Style.FIRST_LETTER)
+        i = py_initial.get(char)
         if i and idx_initial.get(i):
             mapping[char] = "".join(sorted(idx_initial[i]))
             i_cnt += 1
+            if prov is not None:
+                prov.add(char, "initial", i, mapping[char])
             continue
-        # 末级：无任何音近含女字（生僻符号等）
-        mapping[char] = "女"
+        # 末级：无任何音近候选（生僻符号等）
+        mapping[char] = target
         const_cnt += 1
+        if prov is not None:
+            prov.add(char, "const", "", target)
 
     print(
         f"  同音字兜底 — 精确同音: {t_cnt}  同音节: {p_cnt}  "
-        f"同声母: {i_cnt}  常量「女」: {const_cnt}"
+        f"同声母: {i_cnt}  常量「{target}」: {const_cnt}"
     )
+    return {
+        "pinyin_index_tone": len(idx_tone),
+        "pinyin_index_plain": len(idx_plain),
+        "pinyin_index_initial": len(idx_initial),
+        "pinyin_tone_hits": t_cnt,
+        "pinyin_plain_hits": p_cnt,
+        "pinyin_initial_hits": i_cnt,
+        "pinyin_const_hits": const_cnt,
+    }
 
 
-def _advanced_mapping(basic_hanzi, nyu_hanzi, mapping):
-    try:
-        from pypinyin import Style, pinyin
-    except ImportError:
-        print("  [跳过] pypinyin 未安装，跳过声旁/上下文推断")
-        return
+def _advanced_mapping(basic_hanzi, nyu_hanzi, mapping, py_table, target=DEFAULT_TARGET, prov=None):
+    if py_table is None:
+        print("  [跳过] pypinyin 未安装且拼音特征表不完整，跳过声旁/上下文推断")
+        return {}
 
     print("  声旁/上下文推断...")
 
     def get_body(ids_str):
-        comps = get_components_except_target_char(ids_str)
+        comps = get_components_except_target_char(ids_str, target)
         return frozenset(comps) if comps else None
 
-    # 构建 nyu 反向映射：{ frozenset(主体): [含女字, ...] }
+    # 构建 nyu 反向映射：{ frozenset(主体): [含目标部件的字, ...] }
     nyu_body_map = {}
     for char, info in nyu_hanzi.items():
-        body = get_body(info.get("IDS", "")) or get_body(info.get("IDS_apparent", ""))
+        body = get_body(info.ids) or get_body(info.ids_apparent)
         if body:
             nyu_body_map.setdefault(body, [])
             if char not in nyu_body_map[body]:
                 nyu_body_map[body].append(char)
 
-    def get_yinjie(char):
-        res = pinyin(char, heteronym=False, style=Style.NORMAL)
-        return res[0][0] if res and res[0] else None
+    get_yinjie = py_table["NORMAL"].get
+    get_yunmu = py_table["FINALS"].get
+    get_shengmu = py_table["FIRST_LETTER"].get
 
-    def get_yunmu(char):
-        res = pinyin(char, heteronym=False, style=Style.FINALS)
-        return res[0][0] if res and res[0] else None
-
-    def get_shengmu(char):
-        res = pinyin(char, heteronym=False, style=Style.FIRST_LETTER)
-        return res[0][0] if res and res[0] else None
-
-    def sound_body(char, ids_str):
-        if not ids_str:
+    def sound_body(char, comps):
+        if not comps:
             return None
         cy, cyu, csm = get_yinjie(char), get_yunmu(char), get_shengmu(char)
-        comps = get_components_except_target_char(ids_str)
         matches = []
         for c in comps:
             if c.startswith("&"):
@@ -353,83 +1008,367 @@ def _advanced_mapping(basic_hanzi, nyu_hanzi, mapping):
                 matches.append(c)
         return frozenset(matches) if len(matches) == 1 else None
 
+    def ctx_body(c, n):
+        if not c or not n:
+            return None
+        common = c & n
+        remainder = c - common
+        return frozenset(remainder) if common and remainder else None
+
     sorted_chars = sorted(
         basic_hanzi.keys(),
-        key=lambda k: int(basic_hanzi[k]["Codepoint"][2:], 16),
+        key=lambda k: int(basic_hanzi[k].codepoint[2:], 16),
     )
+    # 每个基础字的部件集合只切分一次，供自身推断与相邻字上下文复用
+    comps_list = [
+        frozenset(get_components_except_target_char(basic_hanzi[ch].ids, target))
+        for ch in sorted_chars
+    ]
 
-    updated = 0
+    updated = sound_hits = context_hits = 0
     for i, curr_char in enumerate(sorted_chars):
-        curr_ids = basic_hanzi[curr_char].get("IDS", "")
-        inferred = sound_body(curr_char, curr_ids)
+        curr_comps = comps_list[i]
+        inferred = sound_body(curr_char, curr_comps)
+        by_sound = bool(inferred)
+        neighbour = None
 
         if not inferred:
-            def ctx_body(curr_ids, neighbor_ids):
-                c = get_components_except_target_char(curr_ids)
-                n = get_components_except_target_char(neighbor_ids)
-                if not c or not n:
-                    return None
-                common = c & n
-                remainder = c - common
-                return frozenset(remainder) if common and remainder else None
-
             if i > 0:
-                inferred = ctx_body(curr_ids, basic_hanzi[sorted_chars[i - 1]].get("IDS", ""))
+                inferred = ctx_body(curr_comps, comps_list[i - 1])
+                neighbour = sorted_chars[i - 1]
             if not inferred and i < len(sorted_chars) - 1:
-                inferred = ctx_body(curr_ids, basic_hanzi[sorted_chars[i + 1]].get("IDS", ""))
+                inferred = ctx_body(curr_comps, comps_list[i + 1])
+                neighbour = sorted_chars[i + 1]
 
         if inferred and inferred in nyu_body_map:
-            targets = nyu_body_map[inferred]
+            candidates = nyu_body_map[inferred]
             cur_val = mapping.get(curr_char, "")
             new_val = cur_val
-            for t in targets:
+            for t in candidates:
                 if t not in new_val:
                     new_val += t
             if new_val != cur_val:
                 mapping[curr_char] = new_val
                 updated += 1
+                if by_sound:
+                    sound_hits += 1
+                else:
+                    context_hits += 1
+                if prov is not None:
+                    if by_sound:
+                        prov.add(curr_char, "sound", inferred, new_val[len(cur_val):])
+                    else:
+                        prov.add(curr_char, "context", (neighbour, ":", *sorted(inferred)),
+                                 new_val[len(cur_val):])
 
     print(f"  声旁/上下文更新: {updated} 个")
+    return {
+        "nyu_body_map": len(nyu_body_map),
+        "advanced_sound_hits": sound_hits,
+        "advanced_context_hits": context_hits,
+    }
+
+
+# 部件相似度匹配的最低得分：低于此值的最佳候选不采用，交由同音字兜底
+SIMILARITY_MIN_SCORE = 0.5
+
+
+def _similarity_mapping(basic_hanzi, nyu_hanzi, mapping, metric, target=DEFAULT_TARGET, prov=None):
+    """部件相似度匹配：为结构匹配与声旁/上下文推断都未命中的基础汉字，
+    按部件集合相似度（见 similarity.py）批量选出得分最高的含目标部件的汉字。
+    """
+    try:
+        import numpy  # noqa: F401
+        import scipy  # noqa: F401
+    except ImportError:
+        print("  [跳过] numpy/scipy 未安装，跳过部件相似度匹配")
+        return {}
+
+    print(f"  部件相似度匹配（{metric}）...")
+
+    def comps_of(data):
+        return (
+            get_components_except_target_char(data.ids, target)
+            | get_components_except_target_char(data.ids_apparent, target)
+        )
+
+    queries = {
+        char: comps
+        for char, data in basic_hanzi.items()
+        if not mapping.get(char) and (comps := comps_of(data))
+    }
+    candidates = {char: comps for char, data in nyu_hanzi.items() if (comps := comps_of(data))}
+
+    matches = similarity.best_matches(queries, candidates, metric, SIMILARITY_MIN_SCORE)
+    for char, found in matches.items():
+        mapping[char] = "".join(found)
+        if prov is not None:
+            prov.add(char, "similarity", metric, mapping[char])
+    print(f"  部件相似度更新: {len(matches)} / {len(queries)} 个")
+    return {"similarity_queries": len(queries), "similarity_hits": len(matches)}
 
 
 # ──────────────────────────────────────────────
 # Stage 4: 生成 web_mapping*.json
 # ──────────────────────────────────────────────
 
-def rank_candidate(char):
+def rank_candidate(char, coverage=None):
+    """候选字排序键。有字体覆盖位图时，字体可直接渲染的字优先。"""
     cp = ord(char)
     in_bmp_cjk = 0x4E00 <= cp <= 0x9FFF
-    return (0 if in_bmp_cjk else 1, cp)
+    if coverage is None:
+        return (0 if in_bmp_cjk else 1, cp)
+    return (0 if char in coverage else 1, 0 if in_bmp_cjk else 1, cp)
+
+
+# ──────────────────────────────────────────────
+# 候选字排序器：web 阶段据此为每个字排出前 K 个候选，第 0 个即 web_mapping 的目标字
+# ──────────────────────────────────────────────
+#
+# 每个排序器是 工厂(coverage, target) → key(原字, 候选字)，key 越小越靠前。
+# 工厂在构建时运行一次，预先载入所需的表；排序结果写入 web_candidates.bin，
+# 前端与 convert.py 只按序号取字。新增排序器只需加入 RANKERS。
+
+# 默认保留的候选数
+TOP_K = 8
+
+
+def _rank_default(coverage, target):
+    """（字体可渲染优先，）BMP 常用区优先，再按码点。"""
+    return lambda char, cand: rank_candidate(cand, coverage)
+
+
+def _rank_frequency(coverage, target):
+    """按字频表（char_freq.txt）排序，常用的目标字优先；同频再按默认顺序。
+
+    字频表每行一个字，可带以制表符分隔的次数；不带次数时按行序视为由高到低。
+    """
+    if not os.path.exists(CHAR_FREQ_FILE):
+        sys.exit(f"错误：--rank frequency 需要字频表 {CHAR_FREQ_FILE}")
+    freq = {}
+    with open(CHAR_FREQ_FILE, "r", encoding="utf-8") as f:
+        lines = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+    for n, parts in enumerate(lines):
+        char = parts[0].strip()
+        if len(char) == 1 and char not in freq:
+            freq[char] = float(parts[1]) if len(parts) > 1 else len(lines) - n
+    return lambda char, cand: (-freq.get(cand, 0), rank_candidate(cand, coverage))
+
+
+def _rank_tier(coverage, target):
+    """按候选字来自的匹配级别排序：结构匹配优先于推断，推断优先于同音兜底。
+
+    需要 mapping 阶段以 --provenance 生成的来源记录；该目标部件没有记录时退回默认排序。
+    """
+    path = target_file(provenance.PROVENANCE_FILE, target)
+    if not os.path.exists(path):
+        print(f"  [警告] --rank tier 需要 {path}（以 --provenance 运行 mapping 阶段），"
+              f"[{target}] 按默认顺序排序")
+        return _rank_default(coverage, target)
+    prov = provenance.Provenance(path)
+    strength = {}
+    for char in prov.chars():
+        best = strength[char] = {}
+        for tier, _, cands in prov.lookup(char):
+            level = provenance.TIERS.index(tier)
+            for c in cands:
+                best[c] = min(best.get(c, level), level)
+    worst = len(provenance.TIERS)
+    return lambda char, cand: (
+        strength.get(char, {}).get(cand, worst), rank_candidate(cand, coverage)
+    )
+
+
+RANKERS = {
+    "default": _rank_default,
+    "frequency": _rank_frequency,
+    "tier": _rank_tier,
+}
+# 各排序器额外读取的文件（记入构建记录，文件变化时重建 web 阶段）
+RANKER_INPUTS = {
+    "frequency": lambda t: [CHAR_FREQ_FILE],
+    "tier": lambda t: [target_file(provenance.PROVENANCE_FILE, t)],
+}
 
 
-def stage_web():
-    print("=== Stage: web_mapping ===")
+def rank_source(char):
+    """反向索引中原字的排序键：GB2312 一级字优先，其次 BMP 常用区，再按码点。"""
+    cp = ord(char)
+    return (0 if is_hot_char(char) else 1, 0 if 0x4E00 <= cp <= 0x9FFF else 1, cp)
 
-    for f in [MAPPING_FILE]:
-        if not os.path.exists(f):
-            sys.exit(f"错误：缺少 {f}，请先运行 --stage mapping")
 
-    mapping = load_json(MAPPING_FILE)
+def load_font_coverage():
+    """fonts 阶段生成的覆盖位图；尚未生成时返回 None（按码点范围判断兼容性）。"""
+    if not os.path.exists(FONT_COVERAGE_FILE):
+        return None
+    return font_coverage.FontCoverage(FONT_COVERAGE_FILE)
+
+
+# 前端分片：热点分片随页面立即加载，其余按 Unicode 区块、每 WEB_SHARD_SPAN 个码点
+# 一片，按需加载。热点字取 GB2312 一级汉字（按使用频度选出的 3755 个常用字），
+# 作为字频表的近似。
+WEB_SHARD_HOT = "hot"
+WEB_SHARD_SPAN = 0x800
+WEB_SHARD_BLOCKS = [
+    ("cjk", 0x4E00, 0x9FFF),
+    ("ext_a", 0x3400, 0x4DBF),
+    ("other", 0x0000, 0x10FFFF),
+]
+
+
+def is_hot_char(char):
+    try:
+        code = char.encode("gb2312")
+    except UnicodeEncodeError:
+        return False
+    return len(code) == 2 and 0xB0 <= code[0] <= 0xD7
+
+
+def write_web_shards(web_full, web_less, shard_dir):
+    """把映射拆成热点分片与区块分片（HCMB 二进制格式，见 mapping_bin），并写出 manifest.json。
+
+    manifest 中每个区块分片的 range 为其实际键的最小/最大码点，
+    前端据此只为输入中出现的字加载对应分片。
+    """
+    groups = {WEB_SHARD_HOT: []}
+    for char in web_full:
+        if is_hot_char(char):
+            groups[WEB_SHARD_HOT].append(char)
+            continue
+        cp = ord(char)
+        for block, lo, hi in WEB_SHARD_BLOCKS:
+            if lo <= cp <= hi:
+                groups.setdefault(f"{block}-{(cp - lo) // WEB_SHARD_SPAN}", []).append(char)
+                break
+
+    # 清理上次构建遗留的分片
+    if os.path.isdir(shard_dir):
+        for old in os.listdir(shard_dir):
+            os.remove(os.path.join(shard_dir, old))
+    os.makedirs(shard_dir, exist_ok=True)
+
+    manifest = {"hot": None, "shards": []}
+    for name, chars in groups.items():
+        if not chars:
+            continue
+        file = f"{name}.bin"
+        save_mapping_bin(
+            os.path.join(shard_dir, file),
+            {c: web_full[c] for c in chars},
+            {c: web_less[c] for c in chars if c in web_less},
+        )
+        if name == WEB_SHARD_HOT:
+            manifest["hot"] = file
+        else:
+            cps = [ord(c) for c in chars]
+            manifest["shards"].append({
+                "file": file,
+                "range": [min(cps), max(cps)],
+                "count": len(chars),
+            })
+    print(
+        f"生成 {shard_dir}/：热点分片 {len(groups[WEB_SHARD_HOT])} 个映射，"
+        f"区块分片 {len(manifest['shards'])} 个"
+    )
+    save_json(manifest, os.path.join(shard_dir, "manifest.json"), compact=True)
+
+
+def stage_web(ctx, ranker=None, top_k=None):
+    """ranker：RANKERS 中的排序器名（默认 default）；top_k：每字保留的候选数（默认 TOP_K）。"""
+    target = ctx.get("target", DEFAULT_TARGET)
+    mapping_file = target_file(MAPPING_FILE, target)
+    full_file = target_file(WEB_MAPPING_FILE, target)
+    less_file = target_file(WEB_MAPPING_LESS_FILE, target)
+    bin_file = target_file(WEB_MAPPING_BIN_FILE, target)
+    shard_dir = target_file(WEB_SHARD_DIR, target)
+    reverse_file = target_file(reverse_index.REVERSE_INDEX_FILE, target)
+    cand_file = target_file(candidates_bin.CANDIDATES_FILE, target)
+    top_k = top_k or TOP_K
+    print(f"=== Stage: web_mapping [{target}] ===")
+
+    if "mapping" in ctx:
+        mapping = ctx["mapping"]
+    elif os.path.exists(mapping_file):
+        mapping = load_json(mapping_file)
+    else:
+        sys.exit(f"错误：缺少 {mapping_file}，请先运行 --stage mapping")
+
+    coverage = load_font_coverage()
+    if coverage is not None:
+        print(f"  按 {FONT_COVERAGE_FILE} 排序候选字（{coverage.n_fonts} 个字体，{coverage.covered} 个码点）")
+
+    if coverage is None:
+        # 兼容映射：目标字必须在 BMP CJK 常用区（大多数字体可渲染）
+        def is_compat(c):
+            return 0x4E00 <= ord(c) <= 0x9FFF
+    else:
+        def is_compat(c):
+            return c in coverage
+    if ranker and ranker != "default":
+        print(f"  候选字排序器: {ranker}")
+    rank = RANKERS[ranker or "default"](coverage, target)
 
     web_full = {}
     web_less = {}
+    ranked = {}
+    missing = set()
 
     for char, candidates in mapping.items():
         if not candidates or not isinstance(candidates, str):
             continue
-        # 按优先级排序：BMP常用区优先，再按码点升序
-        best = min(candidates, key=rank_candidate)
+        # 按排序器排出前 K 个候选，第 0 个为目标字
+        # （默认：（字体可渲染优先，）BMP常用区优先，再按码点升序）
+        ordered = sorted(candidates, key=lambda c: rank(char, c))
+        top = ordered[:top_k]
+        best = top[0]
         web_full[char] = best
-        # 兼容映射：目标字必须在 BMP CJK 常用区（大多数字体可渲染）
-        if 0x4E00 <= ord(best) <= 0x9FFF:
-            web_less[char] = best
-
-    save_json(web_full, WEB_MAPPING_FILE, compact=True)
-    save_json(web_less, WEB_MAPPING_LESS_FILE, compact=True)
+        # 兼容目标字取排序最前的可渲染候选；默认排序下即 best。
+        # 它不在前 K 个中时附在候选列表末尾，兼容模式轮换时仍以它为第 0 个
+        best_compat = next((c for c in ordered if is_compat(c)), None)
+        if best_compat is not None:
+            web_less[char] = best_compat
+            if best_compat not in top:
+                top.append(best_compat)
+        ranked[char] = top
+        if coverage is not None:
+            # 「换字」与 --pick 也会用到其余候选，不可渲染的一并列入缺字表
+            missing.update(c for c in top if not is_compat(c))
+
+    record_metrics(ctx, web_full=len(web_full), web_less=len(web_less))
+    if coverage is not None:
+        # 字体无法渲染的目标字由前端以 SVG 字形兜底
+        missing_file = target_file(MISSING_GLYPHS_FILE, target)
+        save_json("".join(sorted(missing)), missing_file, compact=True)
+        record_metrics(ctx, missing_glyphs=len(missing))
+        print(f"生成 {missing_file}：{len(missing)} 个缺字")
+    save_json(web_full, full_file, compact=True)
+    save_json(web_less, less_file, compact=True)
+    bin_size = save_mapping_bin(bin_file, web_full, web_less)
+    write_web_shards(web_full, web_less, shard_dir)
+    cand_size = candidates_bin.save_candidates(cand_file, ranked, is_compat, top_k)
+    record_metrics(ctx, candidates=sum(map(len, ranked.values())))
+    # 每个原字的全部候选都可还原：标准目标字优先，其次兼容目标字，再按排序先后
+    reverse = reverse_index.invert_candidates(
+        {
+            char: list(dict.fromkeys([web_full[char], web_less.get(char, web_full[char]), *top]))
+            for char, top in ranked.items()
+        },
+        rank_source,
+    )
+    # 目标字本身是常用字（如「好」「妻」）时，原文中更可能就是它本身：排在首位，还原时保持不变
+    for char, sources in reverse.items():
+        if is_hot_char(char) and char not in sources:
+            sources.insert(0, char)
+    ambiguous = sum(len(sources) > 1 for sources in reverse.values())
+    reverse_size = reverse_index.save_index(reverse_file, reverse)
+    record_metrics(ctx, reverse_targets=len(reverse), reverse_ambiguous=ambiguous)
 
     print(
-        f"生成 {WEB_MAPPING_FILE}：{len(web_full)} 个映射\n"
-        f"生成 {WEB_MAPPING_LESS_FILE}：{len(web_less)} 个映射（兼容）\n"
+        f"生成 {full_file}：{len(web_full)} 个映射\n"
+        f"生成 {less_file}：{len(web_less)} 个映射（兼容）\n"
+        f"生成 {bin_file}：{bin_size} 字节（标准 + 兼容）\n"
+        f"生成 {cand_file}：每字至多 {top_k} 个候选，{cand_size} 字节\n"
+        f"生成 {reverse_file}：{len(reverse)} 个目标字，{ambiguous} 个对应多个原字，{reverse_size} 字节\n"
     )
 
     # 展示改进效果示例
@@ -440,6 +1379,147 @@ def stage_web():
             print(f"    {c} → {web_full[c]}  {'(兼容)' if c in web_less else '(仅全量)'}")
 
 
+# ──────────────────────────────────────────────
+# Stage 5: 打包缺字字形 glyphs.bin
+# ──────────────────────────────────────────────
+
+def stage_glyphs(ctx):
+    """把 web 候选字中用到的缺字字形从 glyph_cache/ 打包为一个文件，供前端一次加载。"""
+    target = ctx.get("target", DEFAULT_TARGET)
+    missing_file = target_file(MISSING_GLYPHS_FILE, target)
+    bundle_file = target_file(GLYPH_BUNDLE_FILE, target)
+    print(f"=== Stage: glyphs [{target}] ===")
+
+    if not os.path.isdir(GLYPH_CACHE_DIR):
+        print(f"  [跳过] 没有本地字形缓存 {GLYPH_CACHE_DIR}/，前端将逐字请求 GlyphWiki\n")
+        return
+    if not os.path.exists(missing_file):
+        # 缺字表只在有字体覆盖表时由 web 阶段生成；没有它时不打包，不中断其余目标
+        print(f"  [跳过] 缺少 {missing_file}（需先以字体覆盖表运行 --stage web），"
+              f"前端将逐字请求 GlyphWiki\n")
+        return
+
+    # 缺字表已包含全部候选中的缺字（「换字」与 --pick 也会用到）
+    used = set(load_json(missing_file))
+    glyphs = {}
+    absent = []
+    for char in sorted(used):
+        path = os.path.join(GLYPH_CACHE_DIR, glyph_bundle.glyph_filename(char))
+        if not os.path.exists(path):
+            absent.append(char)
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            glyphs[char] = glyph_bundle.minify_svg(f.read())
+
+    size = glyph_bundle.save_bundle(bundle_file, glyphs)
+    record_metrics(ctx, glyphs_used=len(used), glyphs_bundled=len(glyphs), bundle_bytes=size)
+    print(f"生成 {bundle_file}：{len(glyphs)} / {len(used)} 个缺字字形，{size} 字节")
+    if absent:
+        names = " ".join(glyph_bundle.glyph_filename(c) for c in absent[:10])
+        print(f"  字形缓存中缺少 {len(absent)} 个（前端对这些字仍请求 GlyphWiki）：{names}"
+              + (" ..." if len(absent) > 10 else ""))
+    print()
+
+
+# ──────────────────────────────────────────────
+# 附加阶段: 全语料部件倒排索引 component_index.bin
+# ──────────────────────────────────────────────
+
+def _corpus_records(ctx):
+    """raw_data 全部字的记录，跨目标共享。
+
+    与 nyu 阶段相同：按文件名排序合并，同一字先出现的文件优先。
+    """
+    cache = shared(ctx)
+    if "corpus_records" not in cache:
+        input_files = _raw_data_files()
+        if not input_files:
+            sys.exit(f"错误：在 {RAW_DATA_DIR} 中找不到 IDS 文件")
+        records = {}
+        for filepath in input_files:
+            for char, info in _raw_records(ctx, filepath).items():
+                records.setdefault(char, info)
+        cache["corpus_records"] = records
+    return cache["corpus_records"]
+
+
+def stage_index(ctx):
+    """为 raw_data 全部字建立 部件 → 码点倒排表 的可 mmap 索引，与目标部件无关。"""
+    print("=== Stage: component_index ===")
+    char_comps = {
+        char: component_index.char_components(info["IDS"], info["IDS_apparent"])
+        for char, info in _corpus_records(ctx).items()
+    }
+
+    size = component_index.save_index(component_index.COMPONENT_INDEX_FILE, char_comps)
+    vocab = set().union(*char_comps.values()) if char_comps else set()
+    record_metrics(ctx, indexed_chars=len(char_comps), components=len(vocab), index_bytes=size)
+    print(
+        f"生成 {component_index.COMPONENT_INDEX_FILE}：{len(char_comps)} 个字，"
+        f"{len(vocab)} 个部件，{size} 字节\n"
+    )
+
+
+# ──────────────────────────────────────────────
+# 附加阶段: 字体覆盖位图 font_coverage.bin
+# ──────────────────────────────────────────────
+
+def _font_files():
+    if not os.path.isdir(FONT_DIR):
+        return []
+    return sorted(
+        os.path.join(FONT_DIR, f) for f in os.listdir(FONT_DIR)
+        if f.lower().endswith(font_coverage.FONT_SUFFIXES)
+    )
+
+
+def stage_fonts(ctx):
+    """读取 fonts/ 下全部字体的 cmap，合并为码点覆盖位图，供 web 阶段排序候选字。"""
+    print("=== Stage: font_coverage ===")
+    fonts = _font_files()
+    if not fonts:
+        sys.exit(f"错误：{FONT_DIR}/ 中没有字体文件（{', '.join(font_coverage.FONT_SUFFIXES)}）")
+    try:
+        import fontTools  # noqa: F401
+    except ImportError:
+        sys.exit("错误：读取字体需要 fontTools（pip install fonttools brotli）")
+
+    codepoints = set()
+    for path in fonts:
+        cps = font_coverage.font_codepoints(path)
+        print(f"  {os.path.basename(path)}: {len(cps)} 个码点")
+        codepoints |= cps
+
+    size = font_coverage.save_coverage(FONT_COVERAGE_FILE, codepoints, len(fonts))
+    record_metrics(ctx, fonts=len(fonts), covered_codepoints=len(codepoints))
+    print(f"生成 {FONT_COVERAGE_FILE}：{len(codepoints)} 个码点，{size} 字节\n")
+
+
+# ──────────────────────────────────────────────
+# 附加阶段: IDS 递归拆分 ids_leaves.json
+# ──────────────────────────────────────────────
+
+def load_leaves(path=DECOMPOSITION_FILE):
+    """读取 ids_leaves.json，返回 (prefer_apparent, { 字: 叶部件元组 })；未收录的字即其自身。"""
+    data = load_json(path)
+    return data["prefer_apparent"], {char: tuple(v) for char, v in data["leaves"].items()}
+
+
+def stage_decompose(ctx, prefer_apparent=False):
+    """把 raw_data 全部字递归展开到叶部件并落盘，与目标部件无关。"""
+    print(f"=== Stage: decompose{' [IDS_apparent 优先]' if prefer_apparent else ''} ===")
+    decomposer = Decomposer(_corpus_records(ctx), prefer_apparent)
+    leaves = decomposer.expand_all()
+
+    shared(ctx)["leaves"] = (prefer_apparent, leaves)
+    save_json(
+        {"prefer_apparent": prefer_apparent, "leaves": {c: list(v) for c, v in leaves.items()}},
+        DECOMPOSITION_FILE, compact=True,
+    )
+    record_metrics(ctx, decomposed_chars=len(leaves), cycles=decomposer.cycles)
+    print(f"生成 {DECOMPOSITION_FILE}：{len(leaves)} 个可拆字，截断环 {decomposer.cycles} 处\n")
+
+
 # ──────────────────────────────────────────────
 # 主入口
 # ──────────────────────────────────────────────
@@ -449,9 +1529,393 @@ STAGES = {
     "basic": stage_basic,
     "mapping": stage_mapping,
     "web": stage_web,
+    "glyphs": stage_glyphs,
+    "index": stage_index,
+    "decompose": stage_decompose,
+    "fonts": stage_fonts,
 }
 
-FULL_PIPELINE = ["nyu", "basic", "mapping", "web"]
+FULL_PIPELINE = ["nyu", "basic", "mapping", "web", "glyphs"]
+
+
+# ──────────────────────────────────────────────
+# 增量构建：按输入与代码的内容哈希跳过未变化的阶段
+# ──────────────────────────────────────────────
+
+def _raw_data_files():
+    """raw_data 下的 IDS 文件，按去掉压缩后缀的文件名排序；同名只取一个版本。"""
+    chosen = {}
+    for suffix in RAW_SUFFIXES:
+        for path in glob.glob(os.path.join(RAW_DATA_DIR, "*" + suffix)):
+            chosen.setdefault(raw_name(path), path)
+    return [chosen[name] for name in sorted(chosen)]
+
+
+def basic_ids_file():
+    """IDS-UCS-Basic 实际存放的路径（可为压缩版本）；都不存在时返回未压缩路径。"""
+    for suffix in RAW_SUFFIXES:
+        path = BASIC_IDS_FILE[:-len(".txt")] + suffix
+        if os.path.exists(path):
+            return path
+    return BASIC_IDS_FILE
+
+
+# 每个阶段（按目标部件）读取的文件、写出的文件，以及决定其输出的代码：code 中列出的
+# 阶段函数连同它（递归）用到的辅助函数、模块级常量与本地模块，见 _code_digest。
+# 上游阶段的输出即下游阶段的输入，内容未变时下游自然被跳过。
+# options：影响输出的阶段参数，取值记入构建记录；option_inputs：参数开启时按其取值追加的输入。
+# env：影响输出的已安装依赖的版本。
+# per_target=False 的阶段与目标部件无关，多目标构建时只记录、运行一次。
+STAGE_DEPS = {
+    "nyu": {
+        "inputs": lambda t: _raw_data_files(),
+        "outputs": lambda t: [target_file(NYU_HANZI_FILE, t)],
+        "code": [stage_nyu],
+    },
+    "basic": {
+        "inputs": lambda t: [basic_ids_file(), target_file(NYU_HANZI_FILE, t)],
+        "outputs": lambda t: [target_file(ALL_BASIC_HANZI_FILE, t)],
+        "code": [stage_basic],
+    },
+    "mapping": {
+        # 部件整体索引建立在 IDS-UCS-Basic 全部字之上；拼音缓存在运行中按需补全，记录运行后的内容
+        "inputs": lambda t: [
+            basic_ids_file(), target_file(ALL_BASIC_HANZI_FILE, t), target_file(NYU_HANZI_FILE, t),
+            PINYIN_TABLE_FILE, target_file(PINYIN_CACHE_FILE, t),
+        ],
+        "outputs": lambda t: [target_file(MAPPING_FILE, t), target_file(provenance.PROVENANCE_FILE, t)],
+        "code": [stage_mapping],
+        "env": ["pypinyin"],
+        "options": ["deep_ids", "similarity_metric", "provenance_log"],
+        "option_inputs": {"deep_ids": lambda t, v: [DECOMPOSITION_FILE]},
+    },
+    "web": {
+        "inputs": lambda t: [target_file(MAPPING_FILE, t), FONT_COVERAGE_FILE],
+        "outputs": lambda t: [
+            target_file(WEB_MAPPING_FILE, t), target_file(WEB_MAPPING_LESS_FILE, t),
+            target_file(WEB_MAPPING_BIN_FILE, t), target_file(WEB_SHARD_DIR, t),
+            target_file(MISSING_GLYPHS_FILE, t), target_file(reverse_index.REVERSE_INDEX_FILE, t),
+            target_file(candidates_bin.CANDIDATES_FILE, t),
+        ],
+        "code": [stage_web],
+        "options": ["ranker", "top_k"],
+        "option_inputs": {"ranker": lambda t, v: RANKER_INPUTS.get(v, lambda t: [])(t)},
+    },
+    "glyphs": {
+        "inputs": lambda t: [target_file(MISSING_GLYPHS_FILE, t), GLYPH_CACHE_DIR],
+        "outputs": lambda t: [target_file(GLYPH_BUNDLE_FILE, t)],
+        "code": [stage_glyphs],
+    },
+    "index": {
+        "inputs": lambda t: _raw_data_files(),
+        "outputs": lambda t: [component_index.COMPONENT_INDEX_FILE],
+        "code": [stage_index],
+        "per_target": False,
+    },
+    "decompose": {
+        "inputs": lambda t: _raw_data_files(),
+        "outputs": lambda t: [DECOMPOSITION_FILE],
+        "code": [stage_decompose],
+        "options": ["prefer_apparent"],
+        "per_target": False,
+    },
+    "fonts": {
+        "inputs": lambda t: _font_files(),
+        "outputs": lambda t: [FONT_COVERAGE_FILE],
+        "code": [stage_fonts],
+        "per_target": False,
+    },
+}
+
+
+def _local_imports(module):
+    """module 导入的本地模块：import 的模块，以及 from … import 的函数、类所属的模块。"""
+    found = []
+    for obj in vars(module).values():
+        local = _local_module(obj)
+        if local is not None:
+            found.append(local)
+    return found
+
+
+def _local_module(obj):
+    """obj 是本地模块（与 build.py 同目录）或其中定义的函数、类时返回该模块，否则 None。"""
+    if not inspect.ismodule(obj):
+        obj = sys.modules.get(getattr(obj, "__module__", None) or "")
+    path = getattr(obj, "__file__", None)
+    if path and os.path.dirname(os.path.abspath(path)) == SOURCE_DIR:
+        return obj
+    return None
+
+
+def _code_names(code):
+    """函数体（含其中的 lambda、推导式与嵌套函数）引用的全局名与属性名。"""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _stable_repr(obj):
+    """常量的稳定表示：集合排序后输出，函数、类与模块只取名称（其代码另行计入）。"""
+    if isinstance(obj, dict):
+        return "{" + ",".join(sorted(f"{_stable_repr(k)}:{_stable_repr(v)}" for k, v in obj.items())) + "}"
+    if isinstance(obj, (set, frozenset)):
+        return "{" + ",".join(sorted(map(_stable_repr, obj))) + "}"
+    if isinstance(obj, (list, tuple)):
+        return "[" + ",".join(map(_stable_repr, obj)) + "]"
+    if inspect.isfunction(obj) or inspect.isclass(obj) or inspect.ismodule(obj):
+        return f"<{obj.__name__}>"
+    if isinstance(obj, struct.Struct):
+        return f"Struct({obj.format!r})"
+    text = repr(obj)
+    return type(obj).__qualname__ if " at 0x" in text else text
+
+
+def _code_digest(roots):
+    """阶段代码的哈希：从 roots（阶段函数）出发，沿函数体引用的全局名递归收集。
+
+    build.py 中定义的函数与类按源码计入，模块级常量按取值计入（容器中的函数同样
+    展开，如 RANKERS），其他本地模块按整个源文件计入（含其导入的本地模块）。
+    只有阶段实际用到的代码参与哈希，如改动 rank_candidate 只让 web 阶段重建。
+    """
+    namespace = globals()
+    parts = {}
+    modules = []
+    seen = set()
+
+    def visit(obj):
+        if id(obj) in seen:
+            return
+        seen.add(id(obj))
+        if inspect.isfunction(obj) or inspect.isclass(obj):
+            if obj.__module__ != __name__:
+                local = _local_module(obj)
+                if local is not None:
+                    modules.append(local)
+                return
+            parts[f"code:{obj.__qualname__}"] = inspect.getsource(obj)
+            # 类取其全部方法（含 classmethod、staticmethod 包装的函数）
+            funcs = [obj] if inspect.isfunction(obj) else [
+                f for f in (getattr(v, "__func__", v) for v in vars(obj).values())
+                if inspect.isfunction(f)
+            ]
+            for func in funcs:
+                for name in _code_names(func.__code__):
+                    if name not in namespace:
+                        continue
+                    value = namespace[name]
+                    if not (inspect.isfunction(value) or inspect.isclass(value)
+                            or inspect.ismodule(value)):
+                        # 只有大写名是常量；小写的模块级变量是运行时状态（如 _digest_cache）
+                        if name.upper() != name:
+                            continue
+                        parts[f"const:{name}"] = _stable_repr(value)
+                    visit(value)
+        elif inspect.ismodule(obj):
+            local = _local_module(obj)
+            if local is not None:
+                modules.append(local)
+        elif isinstance(obj, dict):
+            for value in obj.values():
+                visit(value)
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            for value in obj:
+                visit(value)
+
+    for root in roots:
+        visit(root)
+
+    paths = set()
+    while modules:
+        module = modules.pop()
+        path = os.path.abspath(module.__file__)
+        if path not in paths:
+            paths.add(path)
+            modules.extend(_local_imports(module))
+    for path in paths:
+        parts[f"file:{os.path.basename(path)}"] = file_digest(path)
+
+    h = hashlib.sha1()
+    for key in sorted(parts):
+        h.update(f"{key}\0{parts[key]}\0".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _env_versions(packages):
+    """已安装依赖的版本；未安装为 None。"""
+    versions = {}
+    for name in packages:
+        try:
+            versions[name] = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def _path_digest(path):
+    """文件取内容哈希；目录取其下全部文件（含文件名）的合并哈希。"""
+    if not os.path.isdir(path):
+        return file_digest(path)
+    h = hashlib.sha1()
+    for name in sorted(os.listdir(path)):
+        h.update(name.encode("utf-8"))
+        h.update(file_digest(os.path.join(path, name)).encode("ascii"))
+    return h.hexdigest()
+
+
+def _files_digest(paths):
+    return {p: _path_digest(p) if os.path.exists(p) else None for p in paths}
+
+
+def _manifest_key(stage, target):
+    if target == DEFAULT_TARGET or not STAGE_DEPS[stage].get("per_target", True):
+        return stage
+    return f"{stage}:{target}"
+
+
+def _stage_state(stage, target, kwargs):
+    deps = STAGE_DEPS[stage]
+    options = {k: kwargs.get(k, False) for k in deps.get("options", [])}
+    inputs = deps["inputs"](target)
+    for k, extra in deps.get("option_inputs", {}).items():
+        if options.get(k):
+            inputs = inputs + extra(target, options[k])
+    state = {
+        "code": _code_digest(deps["code"]),
+        "inputs": _files_digest(inputs),
+    }
+    if deps.get("env"):
+        state["env"] = _env_versions(deps["env"])
+    # 参数全为默认值时不写入，旧的构建记录仍然有效
+    if any(options.values()):
+        state["options"] = options
+    return state
+
+
+def _stale_reason(stage, target, manifest, kwargs=None):
+    """返回阶段需要重建的原因；可以跳过时返回 None。"""
+    record = manifest.get(_manifest_key(stage, target))
+    if record is None:
+        return "无构建记录"
+    state = _stage_state(stage, target, kwargs or {})
+    if record.get("code") != state["code"]:
+        return "代码变更"
+    if record.get("options") != state.get("options"):
+        return "参数变更"
+    if record.get("env") != state.get("env"):
+        return "依赖版本变更"
+    if record.get("inputs") != state["inputs"]:
+        changed = [p for p, d in state["inputs"].items() if record["inputs"].get(p) != d]
+        return "输入变更: " + ", ".join(changed)
+    # 记录为 None 的输出（阶段按条件未生成）仍不存在时视为未变化
+    for path, digest in record.get("outputs", {}).items():
+        current = _path_digest(path) if os.path.exists(path) else None
+        if current != digest:
+            return f"输出缺失或被改动: {path}"
+    return None
+
+
+def _record_stage(stage, target, manifest, kwargs=None):
+    record = _stage_state(stage, target, kwargs or {})
+    record["outputs"] = _files_digest(STAGE_DEPS[stage]["outputs"](target))
+    manifest[_manifest_key(stage, target)] = record
+    save_json(manifest, BUILD_MANIFEST_FILE)
+
+
+def _forget_stage(stage, target, manifest):
+    """删除阶段的构建记录：产物未全部落盘（--no-intermediates）时，下次增量构建须重建。"""
+    if manifest.pop(_manifest_key(stage, target), None) is not None:
+        save_json(manifest, BUILD_MANIFEST_FILE)
+
+
+def _run_stage_measured(stage, ctx, kwargs, metrics):
+    """运行阶段并记录墙钟时间、CPU 时间与 tracemalloc 峰值内存。"""
+    tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        STAGES[stage](ctx, **kwargs)
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    metrics.setdefault(ctx["stage_key"], {}).update({
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "peak_mb": round(peak / 2**20, 2),
+    })
+
+
+def print_metrics(metrics):
+    print("=== 阶段耗时与计数（tracemalloc 开启，耗时含其开销） ===")
+    if all(m.get("skipped") for m in metrics.values()):
+        print("  所有阶段均未变化，本次没有运行任何阶段")
+    for key, m in metrics.items():
+        if m.get("skipped"):
+            print(f"  {key:<12} 跳过（未变化）")
+            continue
+        print(f"  {key:<12} 墙钟 {m['wall_s']:.3f}s  CPU {m['cpu_s']:.3f}s  峰值 {m['peak_mb']:.1f} MB")
+        counters = {k: v for k, v in m.items() if k not in ("wall_s", "cpu_s", "peak_mb")}
+        for k, v in counters.items():
+            print(f"      {k}: {v}")
+
+
+def run_pipeline(stages, stage_kwargs, targets=(DEFAULT_TARGET,), force=False,
+                 dry_run=False, write_intermediates=True, metrics=None):
+    """对每个目标部件按顺序运行 stages，跳过输入与代码均未变化的阶段。
+
+    阶段产物经 ctx 在内存中传给下游；被跳过的阶段由下游从文件读取。
+    解析后的语料与部件索引放在 ctx["shared"]，各目标部件共用。
+    传入 metrics（dict）时按阶段记录耗时、峰值内存及各阶段上报的计数；
+    跳过的阶段记为 {"skipped": true}，报告中仍可看出本次没有运行哪些阶段。
+
+    不写中间产物时，下游无法从文件读取被跳过阶段的结果，记录的产物摘要也对不上
+    磁盘上的文件：因此总是全部重建，并删除所运行阶段的构建记录，而不是写入。
+    """
+    if not write_intermediates and not force:
+        print("  --no-intermediates：忽略构建记录，重建所有阶段\n")
+        force = True
+    shared_cache = {}
+    done = set()  # 本次已运行的构建记录键：与目标无关的阶段只运行一次
+    manifest = load_json(BUILD_MANIFEST_FILE) if os.path.exists(BUILD_MANIFEST_FILE) else {}
+    for target in targets:
+        ctx = {
+            "target": target,
+            "write_intermediates": write_intermediates,
+            "shared": shared_cache,
+            "metrics": metrics,
+        }
+        upstream_dirty = False
+        for stage in stages:
+            key = _manifest_key(stage, target)
+            kwargs = stage_kwargs.get(stage, {})
+            if key in done:
+                continue
+            reason = "--force" if force else _stale_reason(stage, target, manifest, kwargs)
+            if dry_run:
+                if reason is None and upstream_dirty:
+                    reason = "上游阶段将重建"
+                upstream_dirty = upstream_dirty or reason is not None
+                print(f"  {stage:<8} [{target}] {'重建 (' + reason + ')' if reason else '跳过'}")
+                done.add(key)
+                continue
+            if reason is None:
+                print(f"=== Stage: {stage} [{target}] — 未变化，跳过 ===\n")
+                if metrics is not None:
+                    metrics[key] = {"skipped": True}
+                continue
+            ctx["stage_key"] = key
+            if metrics is None:
+                STAGES[stage](ctx, **kwargs)
+            else:
+                _run_stage_measured(stage, ctx, kwargs, metrics)
+            if write_intermediates:
+                _record_stage(stage, target, manifest, kwargs)
+            else:
+                _forget_stage(stage, target, manifest)
+            done.add(key)
+    save_digest_cache()
 
 
 def main():
@@ -463,15 +1927,155 @@ def main():
     parser.add_argument(
         "--stage",
         choices=list(STAGES.keys()),
-        help="只运行指定阶段（默认：全流程）",
+        help="只运行指定阶段（强制运行；默认：增量全流程）",
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help="nyu 阶段并行解析 raw_data 的进程数（默认 1，即串行；0 表示 CPU 核数）",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="忽略构建记录，重建所有阶段",
+    )
+    parser.add_argument(
+        "--dry-run", "-n",
+        action="store_true",
+        help="只列出将要重建的阶段及原因，不实际运行",
+    )
+    parser.add_argument(
+        "--no-intermediates",
+        action="store_true",
+        help="不写出 nyu_hanzi/all_basic_hanzi/mapping 中间 JSON，仅在内存中传递（隐含 --force，不写构建记录）",
+    )
+    parser.add_argument(
+        "--targets",
+        default=DEFAULT_TARGET,
+        metavar="部件,...",
+        help=f"逗号分隔的目标部件，一次解析语料后逐个生成映射（默认：{DEFAULT_TARGET}）",
+    )
+    parser.add_argument(
+        "--deep-ids",
+        action="store_true",
+        help="mapping 阶段追加递归拆分匹配（叶部件多重集相同即匹配；全流程时自动先运行 decompose）",
+    )
+    parser.add_argument(
+        "--prefer-apparent",
+        action="store_true",
+        help="decompose 阶段优先按 IDS_apparent 拆分",
+    )
+    parser.add_argument(
+        "--similarity",
+        choices=similarity.METRICS,
+        help="mapping 阶段在同音字兜底前追加部件相似度匹配（需 numpy 与 scipy）",
+    )
+    parser.add_argument(
+        "--raw-manifest",
+        action="store_true",
+        help=f"重新生成 {RAW_MANIFEST_FILE}（raw_data 各文件的哈希与行数）后退出",
+    )
+    parser.add_argument(
+        "--update-pinyin-table",
+        action="store_true",
+        help=f"把 {CORPUS_CACHE_DIR}/ 中各目标部件补算的拼音并入 {PINYIN_TABLE_FILE} 后退出",
+    )
+    parser.add_argument(
+        "--rank",
+        choices=list(RANKERS),
+        help="web 阶段的候选字排序器（默认 default；frequency 需 char_freq.txt，tier 需先 --provenance）",
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        metavar="K",
+        help=f"web_candidates.bin 中每字保留的候选数（默认 {TOP_K}，至多 254）",
+    )
+    parser.add_argument(
+        "--provenance",
+        action="store_true",
+        help="mapping 阶段记录每个字的来源级别与依据，写入 mapping_provenance.bin（见 provenance.py）",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="记录并打印每个阶段的耗时、峰值内存、索引大小与各级命中数",
+    )
+    parser.add_argument(
+        "--metrics-out",
+        metavar="PATH",
+        help="把阶段指标写入 JSON 文件（隐含 --profile；跳过的阶段记为 {\"skipped\": true}）",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="PATH",
+        help="用 cProfile 运行并把统计写入 PATH，同时打印累计耗时最高的函数",
     )
     args = parser.parse_args()
+    if args.raw_manifest:
+        write_raw_manifest()
+        save_digest_cache()
+        return
+    if args.update_pinyin_table:
+        update_pinyin_table()
+        return
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    stage_kwargs = {
+        "nyu": {"jobs": jobs},
+        "mapping": {
+            "deep_ids": args.deep_ids,
+            "similarity_metric": args.similarity,
+            "provenance_log": args.provenance,
+        },
+        "decompose": {"prefer_apparent": args.prefer_apparent},
+        "web": {"ranker": args.rank, "top_k": args.top_k},
+    }
 
-    if args.stage:
-        STAGES[args.stage]()
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    for t in targets:
+        if len(t) != 1:
+            sys.exit(f"错误：目标部件须为单个字符：{t}")
+
+    if args.top_k is not None and not 1 <= args.top_k <= 254:
+        sys.exit("错误：--top-k 须在 1 到 254 之间")
+
+    if args.similarity:
+        try:
+            import numpy  # noqa: F401
+            import scipy  # noqa: F401
+        except ImportError:
+            sys.exit("错误：--similarity 需要 numpy 与 scipy（pip install numpy scipy）")
+
+    metrics = {} if (args.profile or args.metrics_out) and not args.dry_run else None
+    stages = [args.stage] if args.stage else FULL_PIPELINE
+    if args.deep_ids and not args.stage:
+        stages = ["decompose"] + stages
+
+    def run():
+        run_pipeline(stages, stage_kwargs, targets=targets, force=args.force or bool(args.stage),
+                     dry_run=args.dry_run, write_intermediates=not args.no_intermediates,
+                     metrics=metrics)
+
+    if args.cprofile:
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.runcall(run)
+        profiler.dump_stats(args.cprofile)
+        print(f"cProfile 统计已写入 {args.cprofile}，累计耗时前 15：")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
     else:
-        for stage in FULL_PIPELINE:
-            STAGES[stage]()
+        run()
+
+    if metrics is not None:
+        print_metrics(metrics)
+        if args.metrics_out:
+            save_json(metrics, args.metrics_out)
+            print(f"指标已写入 {args.metrics_out}")
+    if not args.stage and not args.dry_run:
         print("全流程完成。")
 
 
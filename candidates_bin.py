@@ -0,0 +1,125 @@
+"""
+candidates_bin.py — 每个字前 K 个排好序的候选目标字（编码 + mmap 读取）
+
+web 阶段按排序器（见 build.py 的 RANKERS）为每个字排好候选字，保留前 K 个写入
+web_candidates.bin。第 0 个即 web_mapping.json 中的目标字；前端「换字」与
+convert.py --pick N 取第 N 个（按候选数取模），无需 mapping.json。
+
+文件格式（小端）:
+    头部 16 字节   magic "HCTK" | u16 版本 | u16 K | u32 字数 N | u32 候选总数 M
+    值区 M × u32   候选字码点 | (兼容 << 31)，按键码点升序、每字内按排序先后
+    个数区 N × u8  每个字的候选个数（1..K+1）
+    键区 u16 流    与 HCMB 相同（见 mapping_bin.py）：相对上一键的差值，0 为转义
+
+兼容位表示该候选字可广泛渲染（与 web_mapping_less.json 的判定相同）。兼容模式下
+只在带兼容位的候选中轮换：第 0 个是排序最前的可渲染候选，与兼容映射一致；它不在
+前 K 个中时附在末尾（故个数至多 K+1）。没有可渲染候选的字在兼容模式下不转换。
+读取时按个数区求一次前缀和，之后按 (字, 序号) 取候选为 O(1)。
+前端 app.js 中的 decodeCandidatesBin 读取同一格式。
+"""
+
+import array
+import bisect
+import itertools
+import mmap
+import os
+import struct
+import sys
+
+from mapping_bin import COMPAT_BIT, decode_keys, encode_keys
+
+MAGIC = b"HCTK"
+VERSION = 1
+CANDIDATES_FILE = "web_candidates.bin"
+_HEADER = struct.Struct("<4sHHII")
+
+
+def encode_candidates(ranked, compat, top_k):
+    """ranked: { 字: [候选字, ...] }（已排序、已截取）；compat(候选字) → 是否可广泛渲染。"""
+    items = sorted((ord(k), v) for k, v in ranked.items() if v)
+    values = array.array("I")
+    counts = bytearray()
+    for _, cands in items:
+        values.extend(ord(c) | (COMPAT_BIT if compat(c) else 0) for c in cands)
+        counts.append(len(cands))
+    if sys.byteorder != "little":
+        values.byteswap()
+    header = _HEADER.pack(MAGIC, VERSION, top_k, len(items), len(values))
+    return header + values.tobytes() + bytes(counts) + encode_keys(cp for cp, _ in items)
+
+
+def save_candidates(path, ranked, compat, top_k):
+    data = encode_candidates(ranked, compat, top_k)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+class Candidates:
+    """以 mmap 方式读取 HCTK 文件。"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.top_k, n, m = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} 不是 HCTK v{VERSION} 文件")
+        values_end = _HEADER.size + 4 * m
+        if sys.byteorder == "little":
+            self._values = memoryview(self._mm)[_HEADER.size:values_end].cast("I")
+        else:
+            self._values = array.array("I", self._mm[_HEADER.size:values_end])
+            self._values.byteswap()
+        counts = self._mm[values_end:values_end + n]
+        self._offsets = array.array("I", itertools.accumulate(counts, initial=0))
+        self._keys = decode_keys(self._mm[values_end + n:], n)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _range(self, char):
+        cp = ord(char)
+        i = bisect.bisect_left(self._keys, cp)
+        if i < len(self._keys) and self._keys[i] == cp:
+            return self._offsets[i], self._offsets[i + 1]
+        return 0, 0
+
+    @staticmethod
+    def _compat_only(cands):
+        return [v for v in cands if v & COMPAT_BIT]
+
+    def get(self, char, compat=False):
+        """char 的候选字（按排序先后）；compat 为真时按兼容模式筛选。"""
+        lo, hi = self._range(char)
+        cands = self._values[lo:hi]
+        if compat:
+            cands = self._compat_only(cands)
+        return "".join(chr(v & ~COMPAT_BIT) for v in cands)
+
+    def translate_table(self, pick=0, compat=False):
+        """str.translate 所用的 { 码点: 目标字 } 表，每个字取第 pick 个候选（按候选数取模）。
+
+        compat 为真时按兼容模式筛选（见文件格式说明），pick=0 时与兼容映射一致。
+        """
+        table = {}
+        for i, cp in enumerate(self._keys):
+            cands = self._values[self._offsets[i]:self._offsets[i + 1]]
+            if compat:
+                cands = self._compat_only(cands)
+                if not cands:
+                    continue
+            table[cp] = chr(cands[pick % len(cands)] & ~COMPAT_BIT)
+        return table
+
+    def close(self):
+        if isinstance(self._values, memoryview):
+            self._values.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
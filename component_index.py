@@ -0,0 +1,224 @@
+"""
+component_index.py — 全语料部件倒排索引（可 mmap）与交集查询
+
+由 `python build.py --stage index` 生成 component_index.bin，覆盖 raw_data 中的
+全部字（约 10 万）。每个部件（普通汉字或 &...; 实体）对应一个按码点升序的
+倒排表，查询时直接在 mmap 上做交集，无需重建字典。
+
+用法:
+    python component_index.py 女 子            # 同时含「女」和「子」的字
+    python component_index.py --subset 女 子   # 部件全部落在 {女, 子} 之内的字
+    python component_index.py --of 好          # 查看某字的部件
+    python component_index.py --limit 0 女     # 不限输出条数
+
+文件格式（小端）:
+    头部 24 字节   magic "HCCI" | u16 版本 | u16 保留 | u32 部件数 V | u32 字数 C
+                   | u32 倒排总长 P | u32 词表字节数 B
+    字表 C × u32   全部字的码点，升序
+    部件数 C × u8  每个字的不同部件个数（与字表同序，供 --subset 查询）
+    对齐到 4 字节
+    偏移 (V+1) × u32  第 i 个部件的倒排表为 postings[off[i]:off[i+1]]
+    倒排 P × u32   码点
+    词表 B 字节    部件字符串按排序以 \\0 连接（UTF-8），与偏移表同序
+"""
+
+import argparse
+import array
+import bisect
+import mmap
+import struct
+import sys
+
+from utils import tokenize_ids
+
+COMPONENT_INDEX_FILE = "component_index.bin"
+MAGIC = b"HCCI"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHIIII")
+
+
+def char_components(ids, ids_apparent=""):
+    """字的部件集合：IDS 与 IDS_apparent 中出现的全部普通字与实体。"""
+    comps = set()
+    for s in (ids, ids_apparent):
+        tokens = tokenize_ids(s)
+        comps.update(tokens.chars)
+        comps.update(tokens.entities)
+    return comps
+
+
+def encode_index(char_comps):
+    """char_comps: { 字: 部件集合 } → bytes。"""
+    postings_of = {}
+    chars = sorted(char_comps, key=ord)
+    counts = array.array("B")
+    for char in chars:
+        comps = char_comps[char]
+        counts.append(min(len(comps), 255))
+        cp = ord(char)
+        for comp in comps:
+            postings_of.setdefault(comp, []).append(cp)
+
+    vocab = sorted(postings_of)
+    offsets = array.array("I", [0])
+    postings = array.array("I")
+    for comp in vocab:
+        postings.extend(postings_of[comp])  # chars 已按码点升序遍历
+        offsets.append(len(postings))
+
+    char_table = array.array("I", (ord(c) for c in chars))
+    vocab_bytes = "\0".join(vocab).encode("utf-8")
+    if sys.byteorder != "little":
+        for a in (char_table, offsets, postings):
+            a.byteswap()
+
+    counts_bytes = counts.tobytes()
+    padding = b"\0" * (-len(counts_bytes) % 4)
+    header = _HEADER.pack(
+        MAGIC, VERSION, 0, len(vocab), len(chars), len(postings), len(vocab_bytes)
+    )
+    return b"".join((
+        header, char_table.tobytes(), counts_bytes, padding,
+        offsets.tobytes(), postings.tobytes(), vocab_bytes,
+    ))
+
+
+def save_index(path, char_comps):
+    data = encode_index(char_comps)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def _intersect(lists):
+    """若干升序码点序列的交集：以最短者为基准，在其余序列中二分查找。"""
+    lists = sorted(lists, key=len)
+    result = []
+    for cp in lists[0]:
+        for other in lists[1:]:
+            i = bisect.bisect_left(other, cp)
+            if i == len(other) or other[i] != cp:
+                break
+        else:
+            result.append(cp)
+    return result
+
+
+class ComponentIndex:
+    """以 mmap 方式读取 component_index.bin；倒排表为 mmap 上的 memoryview 切片。"""
+
+    def __init__(self, path=COMPONENT_INDEX_FILE):
+        if sys.byteorder != "little":
+            raise RuntimeError("component_index 仅支持小端平台直接映射")
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, n_vocab, n_chars, n_postings, vocab_size = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} 不是 HCCI v{VERSION} 文件")
+        view = memoryview(self._mm)
+        pos = _HEADER.size
+        self._chars = view[pos:pos + 4 * n_chars].cast("I")
+        pos += 4 * n_chars
+        self._counts = view[pos:pos + n_chars]
+        pos += n_chars + (-n_chars % 4)
+        self._offsets = view[pos:pos + 4 * (n_vocab + 1)].cast("I")
+        pos += 4 * (n_vocab + 1)
+        self._postings = view[pos:pos + 4 * n_postings].cast("I")
+        pos += 4 * n_postings
+        vocab = bytes(view[pos:pos + vocab_size]).decode("utf-8").split("\0") if n_vocab else []
+        self._vocab = {comp: i for i, comp in enumerate(vocab)}
+
+    def __len__(self):
+        return len(self._chars)
+
+    @property
+    def vocabulary_size(self):
+        return len(self._vocab)
+
+    def postings(self, comp):
+        """含部件 comp 的字的码点序列（升序）；部件不存在时为空。"""
+        i = self._vocab.get(comp)
+        if i is None:
+            return self._postings[0:0]
+        return self._postings[self._offsets[i]:self._offsets[i + 1]]
+
+    def containing(self, *comps):
+        """同时含全部 comps 的字（即部件集合为 comps 超集的字），按码点升序。"""
+        if not comps:
+            return []
+        return [chr(cp) for cp in _intersect([self.postings(c) for c in set(comps)])]
+
+    def component_count(self, char):
+        cp = ord(char)
+        i = bisect.bisect_left(self._chars, cp)
+        if i < len(self._chars) and self._chars[i] == cp:
+            return self._counts[i]
+        return None
+
+    def within(self, *comps):
+        """部件全部落在 comps 之内的字（部件集合为 comps 子集），按码点升序。"""
+        hits = {}
+        for c in set(comps):
+            for cp in self.postings(c):
+                hits[cp] = hits.get(cp, 0) + 1
+        return [
+            chr(cp) for cp in sorted(hits)
+            if hits[cp] == self.component_count(chr(cp))
+        ]
+
+    def components_of(self, char):
+        """反查某字的部件（遍历词表，仅供调试与命令行使用）。"""
+        cp = ord(char)
+        result = []
+        for comp in self._vocab:
+            p = self.postings(comp)
+            i = bisect.bisect_left(p, cp)
+            if i < len(p) and p[i] == cp:
+                result.append(comp)
+        return sorted(result)
+
+    def close(self):
+        for v in (self._chars, self._counts, self._offsets, self._postings):
+            v.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="部件倒排索引查询",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("components", nargs="*", help="部件（普通字或 &...; 实体）")
+    parser.add_argument("--subset", action="store_true", help="查询部件全部落在给定集合内的字")
+    parser.add_argument("--of", metavar="字", help="查看某字的部件")
+    parser.add_argument("--limit", type=int, default=200, help="最多输出条数（0 为不限，默认 200）")
+    parser.add_argument("--index", default=COMPONENT_INDEX_FILE, help="索引文件路径")
+    args = parser.parse_args()
+
+    try:
+        index = ComponentIndex(args.index)
+    except FileNotFoundError:
+        sys.exit(f"错误：缺少 {args.index}，请先运行 python build.py --stage index")
+
+    with index:
+        if args.of:
+            print(" ".join(index.components_of(args.of)))
+            return
+        if not args.components:
+            parser.error("请至少给出一个部件")
+        chars = index.within(*args.components) if args.subset else index.containing(*args.components)
+        shown = chars if args.limit <= 0 else chars[:args.limit]
+        print("".join(shown))
+        print(f"共 {len(chars)} 个字（索引 {len(index)} 字，{index.vocabulary_size} 个部件）",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+convert.py — 基于 web_mapping*.json 的批量文本转换（命令行 + Python API）
+
+用法:
+    python convert.py input.txt -o output.txt       # 标准映射
+    python convert.py input.txt -o output.txt --compat   # 兼容映射（web_mapping_less.json）
+    cat input.txt | python convert.py > output.txt   # 标准输入 → 标准输出
+    python convert.py big.log -o out.log --jobs 8    # 多进程转换，输出顺序不变
+    python convert.py converted.txt -o plain.txt --reverse   # 按反向索引还原为原字
+    python convert.py input.txt -o output.txt --pick 1       # 每个字改用排序第 2 的候选
+
+Python API:
+    from convert import load_table, load_reverse_table, convert_text, convert_stream
+    table = load_table()
+    convert_text("你好", table)
+    convert_text(converted, load_reverse_table())   # 还原
+
+--pick N 从 web_candidates.bin（每字前 K 个排好序的候选，见 candidates_bin.py）
+取第 N 个候选（按候选数取模），--pick 0 与默认转换相同。
+
+还原使用 web 阶段生成的反向索引 web_reverse.bin（见 reverse_index.py）：每个目标字
+换回优先级最高的原字，与正向转换同样是一次 str.translate。索引覆盖全部候选字，
+--compat 与 --pick 的结果同样可以还原；多个原字换成同一目标字时还原结果只是其中之一。
+
+输入按固定字符数分块流式读取，任何时候只持有有限个分块，适用于 GB 级文件。
+转换表是 str.translate 所用的 { 码点: 目标字 } 字典，增补平面（Ext-B 及以后）
+的目标字按完整码点处理，不会被拆成代理对。
+"""
+
+import argparse
+import collections
+import io
+import sys
+import time
+
+from build import WEB_MAPPING_FILE, WEB_MAPPING_LESS_FILE, load_json
+from candidates_bin import CANDIDATES_FILE, Candidates
+from mapping_bin import BinaryMapping
+from reverse_index import REVERSE_INDEX_FILE, ReverseIndex
+
+CHUNK_SIZE = 1 << 20  # 每块字符数
+
+
+def load_table(path=None, compat=False):
+    """加载映射文件为 str.translate 转换表。path 缺省时按 compat 选择标准/兼容映射。
+
+    path 为 .bin 时按 HCMB 二进制格式读取（见 mapping_bin），compat 选择其中的兼容条目。
+    """
+    if path is not None and path.endswith(".bin"):
+        with BinaryMapping(path) as m:
+            return m.translate_table(compat)
+    if path is None:
+        path = WEB_MAPPING_LESS_FILE if compat else WEB_MAPPING_FILE
+    return {ord(k): v for k, v in load_json(path).items()}
+
+
+def load_candidates_table(pick, compat=False, path=CANDIDATES_FILE):
+    """加载候选字文件为转换表，每个字取第 pick 个候选。"""
+    with Candidates(path) as cands:
+        return cands.translate_table(pick, compat)
+
+
+def load_reverse_table(path=REVERSE_INDEX_FILE):
+    """加载反向索引为还原用的 str.translate 转换表。"""
+    with ReverseIndex(path) as index:
+        return index.translate_table()
+
+
+def convert_text(text, table):
+    return text.translate(table)
+
+
+def iter_chunks(src, chunk_size=CHUNK_SIZE):
+    """从文本流按字符数分块读取。"""
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def convert_stream(src, dst, table, chunk_size=CHUNK_SIZE):
+    """逐块转换 src 写入 dst，返回处理的字符数。"""
+    total = 0
+    for chunk in iter_chunks(src, chunk_size):
+        dst.write(chunk.translate(table))
+        total += len(chunk)
+    return total
+
+
+# ──────────────────────────────────────────────
+# 多进程模式
+# ──────────────────────────────────────────────
+
+_worker_table = None
+
+
+def _init_worker(table):
+    global _worker_table
+    _worker_table = table
+
+
+def _convert_chunk(chunk):
+    return chunk.translate(_worker_table)
+
+
+def convert_stream_parallel(src, dst, table, jobs, chunk_size=CHUNK_SIZE):
+    """多进程逐块转换，按读入顺序写出。
+
+    同时在途的分块数限制为 jobs * 2，内存占用与文件大小无关。
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    total = 0
+    pending = collections.deque()
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(table,)
+    ) as pool:
+        for chunk in iter_chunks(src, chunk_size):
+            pending.append(pool.submit(_convert_chunk, chunk))
+            total += len(chunk)
+            if len(pending) >= jobs * 2:
+                dst.write(pending.popleft().result())
+        while pending:
+            dst.write(pending.popleft().result())
+    return total
+
+
+def _open_text(path, mode):
+    # newline="" 保留原始换行符，输出与输入逐字对应
+    if path == "-":
+        stream = sys.stdin.buffer if "r" in mode else sys.stdout.buffer
+        return io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="全女文批量转换",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("input", nargs="?", default="-", help="输入文件（默认：标准输入）")
+    parser.add_argument("-o", "--output", default="-", help="输出文件（默认：标准输出）")
+    parser.add_argument("--compat", action="store_true", help="使用兼容映射（仅 BMP 常用区目标字）")
+    parser.add_argument("--mapping", help="自定义映射文件路径（.json 或 .bin；.json 时覆盖 --compat；--pick 时为候选字文件）")
+    parser.add_argument(
+        "--pick", type=int, default=0, metavar="N",
+        help=f"取每个字排序第 N 个候选（从 0 起，按候选数取模；读取 {CANDIDATES_FILE}）",
+    )
+    parser.add_argument(
+        "--reverse", action="store_true",
+        help=f"还原：把目标字换回原字（--mapping 此时为反向索引路径，默认 {REVERSE_INDEX_FILE}）",
+    )
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N", help="转换进程数（默认 1）")
+    parser.add_argument(
+        "--chunk-size", type=int, default=CHUNK_SIZE, metavar="CHARS",
+        help=f"每块字符数（默认 {CHUNK_SIZE}）",
+    )
+    args = parser.parse_args()
+
+    if args.reverse:
+        table = load_reverse_table(args.mapping or REVERSE_INDEX_FILE)
+    elif args.pick:
+        table = load_candidates_table(args.pick, args.compat, args.mapping or CANDIDATES_FILE)
+    else:
+        table = load_table(args.mapping, compat=args.compat)
+
+    start = time.perf_counter()
+    with _open_text(args.input, "r") as src, _open_text(args.output, "w") as dst:
+        if args.jobs > 1:
+            total = convert_stream_parallel(src, dst, table, args.jobs, args.chunk_size)
+        else:
+            total = convert_stream(src, dst, table, args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    rate = total / elapsed if elapsed > 0 else float("inf")
+    print(f"转换 {total} 字，用时 {elapsed:.2f}s，{rate:,.0f} 字/秒", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
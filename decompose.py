@@ -0,0 +1,64 @@
+"""
+decompose.py — IDS 递归拆分：把每个字展开到叶部件
+
+get_ids_components_list 只拆一层；本模块沿 raw_data 中各部件自身的 IDS
+继续展开（Ext-B 等部件同样可拆），直到不可再拆的叶部件为止：
+  - 部件的 IDS 就是它自己（如「一」「女」），或 raw_data 中没有它的记录
+    （包括 &CDP-...; 等实体，raw_data 不含其定义），即为叶部件；
+  - 结果按部件记忆化，共享子结构只展开一次（DAG）；
+  - 展开路径上再次遇到正在展开的字时视为叶部件并计入 cycles，不会无限递归；
+  - prefer_apparent=True 时优先使用 IDS_apparent（字形上的直观拆分）。
+
+由 `python build.py --stage decompose` 生成 ids_leaves.json，
+内容为 { "prefer_apparent": bool, "leaves": { 字: [叶部件, ...] } }，
+仅记录可拆的字；build.load_leaves 读回后按字 O(1) 查询，缺省即字本身。
+"""
+
+import itertools
+
+from utils import get_ids_components_list
+
+DECOMPOSITION_FILE = "ids_leaves.json"
+
+
+class Decomposer:
+    """基于 { 字: {IDS, IDS_apparent} } 记录的记忆化递归拆分。"""
+
+    def __init__(self, records, prefer_apparent=False):
+        self._ids = {
+            char: (info["IDS_apparent"] if prefer_apparent and info["IDS_apparent"] else info["IDS"])
+            for char, info in records.items()
+        }
+        self._memo = {}
+        self._active = set()
+        self.cycles = 0
+
+    def leaves(self, comp):
+        """comp 的叶部件元组（保留重复，按拆分顺序）。"""
+        result = self._memo.get(comp)
+        if result is not None:
+            return result
+        if comp in self._active:
+            self.cycles += 1
+            return (comp,)
+
+        parts = get_ids_components_list(self._ids.get(comp, ""))
+        if not parts or parts == [comp]:
+            result = (comp,)
+        else:
+            self._active.add(comp)
+            try:
+                result = tuple(itertools.chain.from_iterable(self.leaves(p) for p in parts))
+            finally:
+                self._active.discard(comp)
+        self._memo[comp] = result
+        return result
+
+    def expand_all(self):
+        """展开全部记录，返回 { 字: 叶部件元组 }，只含可拆（叶部件不是其自身）的字。"""
+        return {
+            char: leaves
+            for char in sorted(self._ids)
+            if (leaves := self.leaves(char)) != (char,)
+        }
+
@@ -0,0 +1,312 @@
+"""
+diffcheck.py — 管线输出差分校验
+
+在同一份语料上分别运行参考管线与其他运行方式（并行、缓存、内存传递、多目标，
+或另一份代码），比较各阶段产物的内容哈希，并对 mapping.json、web_mapping*.json
+给出逐字的结构化差异。用于确认优化后的实现与参考实现输出完全一致。
+
+用法:
+    python diffcheck.py                      # 参考 vs 全部内置方式，全语料
+    python diffcheck.py --sample 0.05        # 每个 raw_data 文件只取约 5% 的字，快速检查
+    python diffcheck.py --variant jobs --variant cached
+    python diffcheck.py --alt-repo ../herchar-opt --variant reference
+                                             # 另一份代码（如优化分支的 worktree）按参考方式运行
+    python diffcheck.py --save-golden golden/    # 把参考输出存为金标准
+    python diffcheck.py --golden golden/         # 与金标准比较（可跨提交）
+    python diffcheck.py --report diff.json   # 同时写出 JSON 报告
+
+每种方式在独立的临时目录中运行 build.py --force（raw_data 以符号链接引入或写入
+抽样子集，已有的 pinyin_table.json 会复制过去），不会改动仓库中的构建产物。
+抽样按 (种子, 码点) 的哈希决定去留，与文件顺序无关，同一种子每次结果相同。
+有任何差异时退出码为 1。
+"""
+
+import argparse
+import contextlib
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import build
+
+# 内置运行方式：build.py 的额外参数；warm 为真时先运行一次预热语料缓存，比较第二次的输出
+VARIANTS = {
+    "reference": {"args": []},
+    "jobs": {"args": ["--jobs", "4"]},
+    "cached": {"args": [], "warm": True},
+    "in-memory": {"args": ["--no-intermediates"]},
+    "targets": {"args": ["--targets", f"{build.DEFAULT_TARGET},子"]},
+}
+DEFAULT_VARIANTS = ["jobs", "cached", "in-memory", "targets"]
+# 逐字比较的产物（按目标部件取文件名）
+DIFF_FILES = [build.MAPPING_FILE, build.WEB_MAPPING_FILE, build.WEB_MAPPING_LESS_FILE]
+GOLDEN_HASHES = "hashes.json"
+
+
+# ──────────────────────────────────────────────
+# 语料准备与运行
+# ──────────────────────────────────────────────
+
+def _keep(line, fraction, seed):
+    codepoint = line.split("\t", 1)[0]
+    return zlib.crc32(f"{seed}:{codepoint}".encode("utf-8")) < fraction * 2**32
+
+
+def write_sample(src_dir, dst_dir, fraction, seed=0):
+    """把 src_dir 中每个 IDS 文件抽样写入 dst_dir（未压缩），注释行全部保留。"""
+    os.makedirs(dst_dir, exist_ok=True)
+    old = build.RAW_DATA_DIR
+    build.RAW_DATA_DIR = src_dir
+    try:
+        files = build._raw_data_files()
+    finally:
+        build.RAW_DATA_DIR = old
+    kept = 0
+    for path in files:
+        with build.open_ids_text(path) as f, \
+                open(os.path.join(dst_dir, build.raw_name(path)), "w", encoding="utf-8") as out:
+            for line in f:
+                if line.startswith(";;") or not line.strip() or _keep(line, fraction, seed):
+                    out.write(line)
+                    kept += not line.startswith(";;") and bool(line.strip())
+    return kept
+
+
+def prepare_workdir(workdir, repo, raw_dir):
+    os.makedirs(workdir)
+    os.symlink(raw_dir, os.path.join(workdir, build.RAW_DATA_DIR))
+    pinyin = os.path.join(repo, build.PINYIN_TABLE_FILE)
+    if os.path.exists(pinyin):
+        shutil.copy(pinyin, workdir)
+
+
+def run_variant(name, spec, repo, workdir, log):
+    """在 workdir 中用 repo 的 build.py 运行一种方式，返回墙钟秒数。"""
+    cmd = [sys.executable, os.path.join(repo, "build.py"), "--force"] + spec["args"]
+    runs = 2 if spec.get("warm") else 1
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        log.write(proc.stdout)
+        if proc.returncode != 0:
+            sys.exit(f"错误：{name} 运行失败（{' '.join(cmd)}），日志见 {log.name}")
+    return time.perf_counter() - start
+
+
+# ──────────────────────────────────────────────
+# 哈希与结构化差异
+# ──────────────────────────────────────────────
+
+def content_hash(path):
+    """文件取内容哈希；目录取其下全部文件（含文件名）的合并哈希；不存在时为 None。"""
+    if not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        h = hashlib.sha1()
+        for name in sorted(os.listdir(path)):
+            h.update(name.encode("utf-8"))
+            h.update(content_hash(os.path.join(path, name)).encode("ascii"))
+        return h.hexdigest()
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def stage_hashes(workdir, target):
+    """{ 阶段: { 产物: 哈希 } }，覆盖全流程各阶段（按目标部件）的产物。"""
+    result = {}
+    for stage in build.FULL_PIPELINE:
+        outputs = build.STAGE_DEPS[stage]["outputs"](target)
+        result[stage] = {p: content_hash(os.path.join(workdir, p)) for p in outputs}
+    return result
+
+
+def diff_entries(ref, alt, show):
+    """逐字比较两个 { 字: 字符串 } 映射。
+
+    返回 {"added", "removed", "changed", "reordered", "examples"}：前四项为计数，
+    reordered 指候选字集合相同而顺序不同（下游按顺序取字时同样会改变结果）。
+    """
+    counts = {"added": 0, "removed": 0, "changed": 0, "reordered": 0}
+    examples = []
+    for char in sorted(ref.keys() | alt.keys()):
+        a, b = ref.get(char), alt.get(char)
+        if a == b:
+            continue
+        if a is None:
+            kind = "added"
+        elif b is None:
+            kind = "removed"
+        elif sorted(a) == sorted(b):
+            kind = "reordered"
+        else:
+            kind = "changed"
+        counts[kind] += 1
+        if len(examples) < show:
+            entry = {"char": char, "kind": kind, "ref": a, "alt": b}
+            if kind == "changed":
+                entry["lost"] = "".join(sorted(set(a) - set(b)))
+                entry["gained"] = "".join(sorted(set(b) - set(a)))
+            examples.append(entry)
+    return dict(counts, examples=examples)
+
+
+def compare_outputs(ref_hashes, alt_hashes, ref_dir, alt_dir, target, show):
+    """比较两次运行：只比较双方都生成了的产物。返回 (阶段差异, 逐字差异)。"""
+    stage_diff = {}
+    for stage in build.FULL_PIPELINE:
+        outputs = ref_hashes.get(stage, {})
+        changed = [
+            p for p, h in outputs.items()
+            if h is not None and alt_hashes[stage].get(p) not in (None, h)
+        ]
+        skipped = [p for p, h in outputs.items() if h is None or alt_hashes[stage].get(p) is None]
+        stage_diff[stage] = {
+            "changed": changed, "skipped": skipped, "compared": len(outputs) - len(skipped),
+        }
+
+    entry_diff = {}
+    for name in DIFF_FILES:
+        path = build.target_file(name, target)
+        ref_path, alt_path = os.path.join(ref_dir, path), os.path.join(alt_dir, path)
+        if not (os.path.exists(ref_path) and os.path.exists(alt_path)):
+            continue
+        if content_hash(ref_path) == content_hash(alt_path):
+            continue
+        entry_diff[path] = diff_entries(build.load_json(ref_path), build.load_json(alt_path), show)
+    return stage_diff, entry_diff
+
+
+def print_comparison(name, stage_diff, entry_diff):
+    print(f"\n── {name} ──")
+    for stage, d in stage_diff.items():
+        if d["changed"]:
+            status = "不同: " + ", ".join(d["changed"])
+        elif not d["compared"]:
+            status = "未生成，跳过"
+        else:
+            status = "一致"
+        print(f"  {stage:<8} {status}")
+    for path, d in entry_diff.items():
+        print(f"  {path}: 新增 {d['added']}  缺少 {d['removed']}  改变 {d['changed']}  仅顺序 {d['reordered']}")
+        for e in d["examples"]:
+            extra = f"  失去 {e['lost']} 得到 {e['gained']}" if e["kind"] == "changed" else ""
+            print(f"      {e['char']} [{e['kind']}] {e['ref']!s:.20} → {e['alt']!s:.20}{extra}")
+
+
+def _has_diff(stage_diff, entry_diff):
+    return bool(entry_diff) or any(d["changed"] for d in stage_diff.values())
+
+
+# ──────────────────────────────────────────────
+# 金标准
+# ──────────────────────────────────────────────
+
+def save_golden(golden_dir, workdir, hashes, target, meta):
+    os.makedirs(golden_dir, exist_ok=True)
+    for name in DIFF_FILES:
+        path = build.target_file(name, target)
+        if os.path.exists(os.path.join(workdir, path)):
+            shutil.copy(os.path.join(workdir, path), os.path.join(golden_dir, path))
+    build.save_json({"meta": meta, "hashes": hashes}, os.path.join(golden_dir, GOLDEN_HASHES))
+
+
+def load_golden(golden_dir, meta):
+    golden = build.load_json(os.path.join(golden_dir, GOLDEN_HASHES))
+    if golden["meta"] != meta:
+        sys.exit(f"错误：金标准的语料或目标与本次不同：{golden['meta']} ≠ {meta}")
+    return golden["hashes"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="herchar 管线输出差分校验",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--variant", action="append", choices=list(VARIANTS),
+                        help=f"与参考比较的运行方式，可重复（默认：{', '.join(DEFAULT_VARIANTS)}）")
+    parser.add_argument("--alt-repo", metavar="DIR",
+                        help="用另一份代码运行 --variant 指定的方式（参考仍用本仓库）")
+    parser.add_argument("--sample", type=float, metavar="F",
+                        help="每个 raw_data 文件按比例 F（0~1）抽样字，默认用全语料")
+    parser.add_argument("--seed", type=int, default=0, help="抽样种子（默认 0）")
+    parser.add_argument("--show", type=int, default=10, metavar="N",
+                        help="每个文件最多列出 N 个差异字（默认 10）")
+    parser.add_argument("--save-golden", metavar="DIR", help="把参考输出与各阶段哈希存为金标准")
+    parser.add_argument("--golden", metavar="DIR",
+                        help="与金标准比较，而不是在本次另跑参考管线")
+    parser.add_argument("--report", metavar="PATH", help="把结果写入 JSON 文件")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录以便检查")
+    args = parser.parse_args()
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    alt_repo = os.path.abspath(args.alt_repo) if args.alt_repo else repo
+    variants = args.variant or (["reference"] if args.alt_repo or args.golden else DEFAULT_VARIANTS)
+    target = build.DEFAULT_TARGET
+    meta = {"sample": args.sample, "seed": args.seed if args.sample else None, "target": target}
+
+    workroot = tempfile.mkdtemp(prefix="herchar-diff-")
+    raw_dir = os.path.join(repo, build.RAW_DATA_DIR)
+    if args.sample:
+        raw_dir = os.path.join(workroot, "raw_sample")
+        kept = write_sample(os.path.join(repo, build.RAW_DATA_DIR), raw_dir, args.sample, args.seed)
+        print(f"抽样 {args.sample:.0%}（种子 {args.seed}）：{kept} 个字")
+
+    report = {"meta": meta, "runs": {}, "comparisons": {}}
+    failed = False
+    with open(os.path.join(workroot, "build.log"), "wb") as log:
+        if args.golden:
+            ref_name, ref_dir = "golden", os.path.abspath(args.golden)
+            ref_hashes = load_golden(ref_dir, meta)
+        else:
+            ref_name, ref_dir = "reference", os.path.join(workroot, "reference")
+            prepare_workdir(ref_dir, repo, raw_dir)
+            seconds = run_variant(ref_name, VARIANTS["reference"], repo, ref_dir, log)
+            ref_hashes = stage_hashes(ref_dir, target)
+            report["runs"][ref_name] = {"seconds": round(seconds, 3), "hashes": ref_hashes}
+            print(f"  {ref_name:<12}{seconds:>8.2f}s")
+            if args.save_golden:
+                save_golden(args.save_golden, ref_dir, ref_hashes, target, meta)
+                print(f"金标准已写入 {args.save_golden}")
+
+        for name in variants:
+            if name == "reference" and alt_repo == repo and not args.golden:
+                continue
+            label = f"{name}@{args.alt_repo}" if args.alt_repo else name
+            alt_dir = os.path.join(workroot, label.replace(os.sep, "_"))
+            prepare_workdir(alt_dir, alt_repo, raw_dir)
+            seconds = run_variant(label, VARIANTS[name], alt_repo, alt_dir, log)
+            alt_hashes = stage_hashes(alt_dir, target)
+            report["runs"][label] = {"seconds": round(seconds, 3), "hashes": alt_hashes}
+            print(f"  {label:<12}{seconds:>8.2f}s")
+
+            stage_diff, entry_diff = compare_outputs(
+                ref_hashes, alt_hashes, ref_dir, alt_dir, target, args.show
+            )
+            report["comparisons"][f"{ref_name} vs {label}"] = {
+                "stages": stage_diff, "entries": entry_diff,
+            }
+            print_comparison(f"{ref_name} vs {label}", stage_diff, entry_diff)
+            failed = failed or _has_diff(stage_diff, entry_diff)
+
+    if args.report:
+        build.save_json(report, args.report)
+        print(f"\n报告已写入 {args.report}")
+    if args.keep:
+        print(f"临时目录保留于 {workroot}")
+    else:
+        with contextlib.suppress(OSError):
+            shutil.rmtree(workroot)
+    if failed:
+        print("\n输出存在差异。")
+        sys.exit(1)
+    print("\n输出一致。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+font_coverage.py — 字体覆盖位图（读取字体 cmap + 紧凑位图格式）
+
+build.py 的 fonts 阶段读取 fonts/ 下的字体文件（如 HanaMinA/B、Noto Serif SC），
+把所有字体 cmap 覆盖的码点合并为一张位图。web 阶段据此按实际可渲染性排序候选字，
+并生成前端需要 SVG 兜底的缺字表。
+
+文件格式（小端）:
+    头部 16 字节   magic "HCFC" | u16 版本 | u16 字体数 | u32 位图覆盖的码点数 N | u32 已覆盖码点数
+    位图 ceil(N / 8) 字节   码点 cp 已覆盖 ⇔ bitmap[cp >> 3] 的第 (cp & 7) 位为 1
+
+N 取 0x40000（0 至 3 号平面，含 CJK Ext-B 至 Ext-J），位图共 32 KiB。
+
+读取字体需要 fontTools（.woff2 另需 brotli）:
+    pip install fonttools brotli
+"""
+
+import os
+import struct
+
+MAGIC = b"HCFC"
+VERSION = 1
+COVERAGE_SPAN = 0x40000
+FONT_SUFFIXES = (".ttf", ".otf", ".ttc", ".otc", ".woff", ".woff2")
+_HEADER = struct.Struct("<4sHHII")
+
+
+def font_codepoints(path):
+    """字体文件 cmap 覆盖的码点集合；.ttc/.otc 合并其中全部字体。"""
+    from fontTools.ttLib import TTCollection, TTFont
+
+    if path.lower().endswith((".ttc", ".otc")):
+        fonts = TTCollection(path, lazy=True).fonts
+    else:
+        fonts = [TTFont(path, lazy=True)]
+    codepoints = set()
+    for font in fonts:
+        cmap = font.getBestCmap()
+        if cmap:
+            codepoints.update(cmap)
+        font.close()
+    return codepoints
+
+
+def encode_coverage(codepoints, n_fonts):
+    bitmap = bytearray((COVERAGE_SPAN + 7) // 8)
+    covered = 0
+    for cp in codepoints:
+        if 0 <= cp < COVERAGE_SPAN:
+            bitmap[cp >> 3] |= 1 << (cp & 7)
+            covered += 1
+    return _HEADER.pack(MAGIC, VERSION, n_fonts, COVERAGE_SPAN, covered) + bytes(bitmap)
+
+
+def save_coverage(path, codepoints, n_fonts):
+    data = encode_coverage(codepoints, n_fonts)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+class FontCoverage:
+    """读取 HCFC 位图；`char in coverage` 判断该字能否由字体直接渲染。"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, self.n_fonts, self._span, self.covered = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} 不是 HCFC v{VERSION} 文件")
+        self._bitmap = data[_HEADER.size:]
+
+    def __contains__(self, char):
+        cp = ord(char)
+        return cp < self._span and bool(self._bitmap[cp >> 3] >> (cp & 7) & 1)
@@ -0,0 +1,76 @@
+"""
+glyph_bundle.py — 缺字 SVG 字形包（打包 + 读取）
+
+build.py 的 glyphs 阶段从本地字形缓存目录（glyph_cache/，文件名与 GlyphWiki
+相同，如 u2a6b2.svg）取出 web_mapping.json 中实际用到的缺字字形，压缩空白后
+打包为一个文件。前端首次遇到缺字时整包加载一次，不再逐字请求 GlyphWiki。
+
+文件格式（小端）:
+    头部 16 字节   magic "HCGB" | u16 版本 | u16 保留 | u32 字形数 N | u32 数据区字节数
+    索引 N × 12 字节   u32 码点 | u32 偏移 | u32 长度，按码点升序；偏移相对数据区起点
+    数据区         各字形的 SVG（UTF-8）首尾相接
+
+前端 app.js 中的 decodeGlyphBundle 读取同一格式。
+"""
+
+import os
+import re
+import struct
+
+MAGIC = b"HCGB"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHII")
+_ENTRY = struct.Struct("<III")
+
+_SVG_NOISE_RE = re.compile(r"<\?xml.*?\?>|<!--.*?-->|<!DOCTYPE[^>]*>", re.S)
+_BETWEEN_TAGS_RE = re.compile(r">\s+<")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def glyph_filename(char):
+    return f"u{ord(char):x}.svg"
+
+
+def minify_svg(svg):
+    """去掉 XML 声明、注释与 DOCTYPE，压缩标签间与连续空白。"""
+    svg = _SVG_NOISE_RE.sub("", svg)
+    svg = _BETWEEN_TAGS_RE.sub("><", svg)
+    return _SPACES_RE.sub(" ", svg).strip()
+
+
+def encode_bundle(glyphs):
+    """glyphs: { 字: SVG 字符串 } → bytes。"""
+    index = []
+    blobs = []
+    offset = 0
+    for char in sorted(glyphs, key=ord):
+        data = glyphs[char].encode("utf-8")
+        index.append(_ENTRY.pack(ord(char), offset, len(data)))
+        blobs.append(data)
+        offset += len(data)
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(index), offset)
+    return header + b"".join(index) + b"".join(blobs)
+
+
+def save_bundle(path, glyphs):
+    data = encode_bundle(glyphs)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+def load_bundle(path):
+    """读取字形包，返回 { 字: SVG 字符串 }。"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, _, count, _ = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} 不是 HCGB v{VERSION} 文件")
+    base = _HEADER.size + count * _ENTRY.size
+    glyphs = {}
+    for i in range(count):
+        cp, offset, length = _ENTRY.unpack_from(data, _HEADER.size + i * _ENTRY.size)
+        glyphs[chr(cp)] = data[base + offset:base + offset + length].decode("utf-8")
+    return glyphs
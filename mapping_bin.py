@@ -0,0 +1,176 @@
+"""
+mapping_bin.py — web 映射的紧凑二进制格式（编码 + mmap 读取）
+
+标准映射与兼容映射合并为一个文件：兼容映射的键是标准映射的子集，且通常目标字
+相同（最佳目标字可广泛渲染），此时每条映射只存一次，另附一个「兼容」标志位。
+按非默认排序器构建时，最佳目标字可能不可广泛渲染而另有可渲染的候选字，这类
+兼容目标字另存于兼容覆盖区。
+
+文件格式（小端）:
+    头部 16 字节   magic "HCMB" | u16 版本 | u16 标志 | u32 条目数 N | u32 键区字节数
+    值区 N × u32   标准目标字码点 | (兼容 << 31)，按键码点升序排列
+    键区 u16 流    键码点相对上一键的差值（首个相对 0）。差值不会为 0，
+                   因此 0 用作转义：其后两个 u16 为绝对码点的高/低 16 位
+    兼容覆盖区     仅当标志位 0 置位时存在，紧随键区：
+                   u32 个数 C | C × u32 条目下标（升序） | C × u32 兼容目标字码点
+                   这些条目的兼容位为 0，兼容目标字与标准目标字不同
+
+值区 4 字节对齐，可直接从 mmap 上按下标读取；键区解码为有序数组后二分查找。
+没有兼容覆盖的文件与旧版完全相同。
+前端 app.js 中的 decodeMappingBin 读取同一格式。
+"""
+
+import array
+import bisect
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"HCMB"
+VERSION = 1
+COMPAT_BIT = 1 << 31
+FLAG_COMPAT_OVERRIDES = 1
+_HEADER = struct.Struct("<4sHHII")
+
+
+def encode_keys(codepoints):
+    """升序码点 → 键区字节（u16 差值流，0 为转义，见文件格式说明）。"""
+    keys = array.array("H")
+    prev = 0
+    for cp in codepoints:
+        delta = cp - prev
+        if 0 < delta <= 0xFFFF:
+            keys.append(delta)
+        else:
+            keys.extend((0, cp >> 16, cp & 0xFFFF))
+        prev = cp
+    if sys.byteorder != "little":
+        keys.byteswap()
+    return keys.tobytes()
+
+
+def decode_keys(raw, count):
+    """键区字节 → 长度为 count 的升序码点数组。"""
+    deltas = array.array("H", raw)
+    if sys.byteorder != "little":
+        deltas.byteswap()
+    keys = array.array("I", bytes(4 * count))
+    cp = i = j = 0
+    while i < count:
+        d = deltas[j]
+        if d:
+            cp += d
+            j += 1
+        else:
+            cp = (deltas[j + 1] << 16) | deltas[j + 2]
+            j += 3
+        keys[i] = cp
+        i += 1
+    return keys
+
+
+def encode_mapping(web_full, web_less):
+    """把 { 字: 目标字 } 标准映射与兼容映射编码为 bytes。兼容目标字不同者写入兼容覆盖区。"""
+    if not web_less.keys() <= web_full.keys():
+        raise ValueError("兼容映射的键须是标准映射的子集")
+    items = sorted((ord(k), v) for k, v in web_full.items())
+    values = array.array("I")
+    override_idx = array.array("I")
+    override_cps = array.array("I")
+    for i, (cp, target) in enumerate(items):
+        compat = web_less.get(chr(cp))
+        if compat is not None and compat != target:
+            override_idx.append(i)
+            override_cps.append(ord(compat))
+            compat = None
+        values.append(ord(target) | (COMPAT_BIT if compat is not None else 0))
+    if sys.byteorder != "little":
+        for a in (values, override_idx, override_cps):
+            a.byteswap()
+    key_bytes = encode_keys(cp for cp, _ in items)
+    flags = FLAG_COMPAT_OVERRIDES if override_idx else 0
+    header = _HEADER.pack(MAGIC, VERSION, flags, len(items), len(key_bytes))
+    data = header + values.tobytes() + key_bytes
+    if flags:
+        data += struct.pack("<I", len(override_idx)) + override_idx.tobytes() + override_cps.tobytes()
+    return data
+
+
+def save_mapping_bin(path, web_full, web_less):
+    """写入 HCMB 文件。先写临时文件再替换，读取方（如 serve.py 热加载）不会读到半个文件。"""
+    data = encode_mapping(web_full, web_less)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+class BinaryMapping:
+    """以 mmap 方式读取 HCMB 文件。值区不复制，键区解码一次后二分查找。"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, count, key_size = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} 不是 HCMB v{VERSION} 文件")
+        values_end = _HEADER.size + count * 4
+        if sys.byteorder == "little":
+            self._values = memoryview(self._mm)[_HEADER.size:values_end].cast("I")
+        else:
+            self._values = array.array("I", self._mm[_HEADER.size:values_end])
+            self._values.byteswap()
+        keys_end = values_end + key_size
+        self._keys = decode_keys(self._mm[values_end:keys_end], count)
+        # 兼容覆盖：条目下标 → 兼容目标字码点（条目很少，直接读成 dict）
+        self._compat_overrides = {}
+        if flags & FLAG_COMPAT_OVERRIDES:
+            (n,) = struct.unpack_from("<I", self._mm, keys_end)
+            pairs = struct.unpack_from(f"<{2 * n}I", self._mm, keys_end + 4)
+            self._compat_overrides = dict(zip(pairs[:n], pairs[n:]))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _index(self, char):
+        cp = ord(char)
+        i = bisect.bisect_left(self._keys, cp)
+        if i < len(self._keys) and self._keys[i] == cp:
+            return i
+        return -1
+
+    def get(self, char, default=None, compat=False):
+        i = self._index(char)
+        if i < 0:
+            return default
+        v = self._values[i]
+        if compat and not v & COMPAT_BIT:
+            override = self._compat_overrides.get(i)
+            return default if override is None else chr(override)
+        return chr(v & ~COMPAT_BIT)
+
+    def items(self, compat=False):
+        overrides = self._compat_overrides
+        for i, (cp, v) in enumerate(zip(self._keys, self._values)):
+            if compat and not v & COMPAT_BIT:
+                if i in overrides:
+                    yield chr(cp), chr(overrides[i])
+                continue
+            yield chr(cp), chr(v & ~COMPAT_BIT)
+
+    def translate_table(self, compat=False):
+        """str.translate 所用的 { 码点: 目标字 } 表。"""
+        return {ord(k): v for k, v in self.items(compat)}
+
+    def close(self):
+        if isinstance(self._values, memoryview):
+            self._values.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
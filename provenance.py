@@ -0,0 +1,213 @@
+"""
+provenance.py — mapping 来源记录（记录 + 列式文件 + 按字查询）
+
+build.py --provenance 运行 mapping 阶段时，各级匹配把「哪个基础字、由哪一级、
+依据什么、加入了哪些候选字」记入 ProvenanceLog，最后写出 mapping_provenance.bin。
+同一 (字, 级别, 依据) 的多次命中合并为一行，候选字按首次加入的顺序排列。
+
+级别与依据:
+    single    单部件提取      依据为空（基础字即提取出的部件）
+    whole     部件整体匹配    匹配上的部件元组（各部件首尾相接）
+    deep      递归拆分匹配    叶部件多重集（排序后首尾相接）
+    sound     声旁推断        推断出的主体部件
+    context   上下文推断      相邻字:主体部件
+    similarity 部件相似度     相似度名称
+    tone / plain / initial    同音字兜底三级   拼音键（如 nv3 / nv / n）
+    const     常量兜底        依据为空
+
+文件格式（小端），按列存放，行按字的码点升序（同一字内保持记录顺序）:
+    头部 24 字节   magic "HCPV" | u16 版本 | u16 级别数 T | u32 行数 N
+                   | u32 级别名字节数 | u32 候选字区字节数 | u32 依据区字节数
+    码点列 N × u32
+    级别列 N × u8       级别名表中的下标
+    级别名 T 个名称，以 \\0 分隔（UTF-8）
+    候选字列 N 个字符串，以 \\0 分隔（UTF-8）
+    依据列 N 个字符串，以 \\0 分隔（UTF-8）
+
+用法:
+    python provenance.py 天 丁            # 查询这些字的来源
+    python provenance.py --summary        # 各级别的行数、字数与候选字串长度
+    python provenance.py --summary --path mapping_provenance_子.bin
+"""
+
+import argparse
+import array
+import bisect
+import collections
+import os
+import struct
+import sys
+
+MAGIC = b"HCPV"
+VERSION = 1
+PROVENANCE_FILE = "mapping_provenance.bin"
+TIERS = (
+    "single", "whole", "deep", "sound", "context", "similarity",
+    "tone", "plain", "initial", "const",
+)
+_HEADER = struct.Struct("<4sHHIIII")
+
+
+def _row_codepoint(row):
+    return row[0][0]
+
+
+class ProvenanceLog:
+    """mapping 阶段的来源记录。
+
+    add 只追加一个元组，合并、排序与编码都推迟到 encode，记录开销可忽略。
+    依据可直接传入部件元组或集合（如部件整体匹配的键、推断出的主体），编码时
+    再拼成字符串：元组按原顺序、集合排序后首尾相接。
+    """
+
+    def __init__(self):
+        self._events = []
+
+    def add(self, char, tier, evidence, candidates):
+        self._events.append((char, tier, evidence, candidates))
+
+    def __len__(self):
+        return len(self._events)
+
+    @staticmethod
+    def _evidence_str(evidence):
+        if isinstance(evidence, tuple):
+            return "".join(evidence)
+        return "".join(sorted(evidence))
+
+    def encode(self, keep=None):
+        """编码为 bytes；传入 keep 时只保留其中的字。"""
+        rows = {}
+        for char, tier, evidence, candidates in self._events:
+            if keep is not None and char not in keep:
+                continue
+            if evidence.__class__ is not str:
+                evidence = self._evidence_str(evidence)
+            key = (ord(char), tier, evidence)
+            parts = rows.get(key)
+            if parts is None:
+                rows[key] = [candidates]
+            else:
+                parts.append(candidates)
+
+        tier_ids = {t: i for i, t in enumerate(TIERS)}
+        codepoints = array.array("I")
+        tiers = bytearray()
+        cand_col = []
+        ev_col = []
+        # 按码点稳定排序，同一字内保持记录顺序
+        for (cp, tier, evidence), parts in sorted(rows.items(), key=_row_codepoint):
+            codepoints.append(cp)
+            tiers.append(tier_ids[tier])
+            ev_col.append(evidence)
+            cand_col.append(parts[0] if len(parts) == 1 else "".join(dict.fromkeys("".join(parts))))
+        if sys.byteorder != "little":
+            codepoints.byteswap()
+        names = "\0".join(TIERS).encode("utf-8")
+        candidates = "\0".join(cand_col).encode("utf-8")
+        evidence = "\0".join(ev_col).encode("utf-8")
+        header = _HEADER.pack(
+            MAGIC, VERSION, len(TIERS), len(cand_col), len(names), len(candidates), len(evidence)
+        )
+        return header + codepoints.tobytes() + tiers + names + candidates + evidence
+
+    def save(self, path, keep=None):
+        data = self.encode(keep)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return len(data)
+
+
+class Provenance:
+    """读取 HCPV 文件。码点列解码为数组后二分查找；字符串列一次解码。"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, n_tiers, n, names_size, cand_size, ev_size = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} 不是 HCPV v{VERSION} 文件")
+        pos = _HEADER.size
+        self._codepoints = array.array("I", data[pos:pos + 4 * n])
+        if sys.byteorder != "little":
+            self._codepoints.byteswap()
+        pos += 4 * n
+        self._tiers = data[pos:pos + n]
+        pos += n
+        self.tier_names = data[pos:pos + names_size].decode("utf-8").split("\0")[:n_tiers]
+        pos += names_size
+        self._candidates = self._strings(data[pos:pos + cand_size], n)
+        pos += cand_size
+        self._evidence = self._strings(data[pos:pos + ev_size], n)
+
+    @staticmethod
+    def _strings(raw, n):
+        return raw.decode("utf-8").split("\0") if n else []
+
+    def __len__(self):
+        return len(self._codepoints)
+
+    def chars(self):
+        """有记录的字，按码点升序。"""
+        return [chr(cp) for cp in dict.fromkeys(self._codepoints)]
+
+    def lookup(self, char):
+        """char 的全部来源 [(级别, 依据, 加入的候选字), ...]，按记录顺序。"""
+        cp = ord(char)
+        lo = bisect.bisect_left(self._codepoints, cp)
+        hi = bisect.bisect_right(self._codepoints, cp, lo)
+        return [
+            (self.tier_names[self._tiers[i]], self._evidence[i], self._candidates[i])
+            for i in range(lo, hi)
+        ]
+
+    def summary(self):
+        """{ 级别: {rows, chars, candidates, max_candidates} }，candidates 为候选字总数。"""
+        stats = {}
+        chars = collections.defaultdict(set)
+        for i, tier_id in enumerate(self._tiers):
+            tier = self.tier_names[tier_id]
+            s = stats.setdefault(tier, {"rows": 0, "candidates": 0, "max_candidates": 0})
+            s["rows"] += 1
+            length = len(self._candidates[i])
+            s["candidates"] += length
+            s["max_candidates"] = max(s["max_candidates"], length)
+            chars[tier].add(self._codepoints[i])
+        for tier, s in stats.items():
+            s["chars"] = len(chars[tier])
+        return {t: stats[t] for t in self.tier_names if t in stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="查询 mapping 来源记录",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("chars", nargs="*", help="要查询的字（可连写）")
+    parser.add_argument("--path", default=PROVENANCE_FILE, help=f"来源文件（默认 {PROVENANCE_FILE}）")
+    parser.add_argument("--summary", action="store_true", help="打印各级别统计")
+    args = parser.parse_args()
+
+    prov = Provenance(args.path)
+    if args.summary:
+        print(f"{'级别':<12}{'行数':>8}{'字数':>8}{'候选字':>10}{'平均':>8}{'最长':>8}")
+        for tier, s in prov.summary().items():
+            avg = s["candidates"] / s["rows"]
+            print(f"{tier:<12}{s['rows']:>8}{s['chars']:>8}{s['candidates']:>10}"
+                  f"{avg:>8.1f}{s['max_candidates']:>8}")
+    for char in "".join(args.chars):
+        rows = prov.lookup(char)
+        if not rows:
+            print(f"{char}: 无记录")
+            continue
+        print(f"{char}:")
+        for tier, evidence, candidates in rows:
+            shown = candidates if len(candidates) <= 40 else candidates[:40] + f"…（共 {len(candidates)} 字）"
+            print(f"  {tier:<10} {evidence or '-':<16} {shown}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+reverse_index.py — 反向映射索引：目标字 → 按优先级排列的原字（编码 + mmap 读取）
+
+web 映射把每个原字换成一个目标字，不同原字可能换成同一个目标字。反向索引
+按目标字列出所有换成它的原字，首位即还原时采用的原字，其余为同样可能的原字；
+原字个数即该目标字的歧义数。build.py 生成索引时，常用的目标字把自身排在首位
+（原文中本来就有的「好」「妻」等不被改写）。
+
+索引覆盖每个原字的全部候选（web_candidates.bin 中的前 K 个，以及兼容目标字），
+因此「换字」或 --pick 转换的文本、兼容映射转换的文本共用一份索引。原字按目标字
+在其候选列表（标准目标字、兼容目标字、其余候选按排序先后）中的序号排列，
+以它为标准目标字的原字在前。
+
+文件格式（小端）:
+    头部 16 字节   magic "HCRI" | u16 版本 | u16 保留 | u32 目标字数 N | u32 原字总数 M
+    目标区 N × u32      目标字码点，升序
+    偏移区 (N + 1) × u32  第 i 个目标字的原字为原字区 [off[i], off[i+1])
+    原字区 M × u32      原字码点，每个目标字内按优先级排列
+
+由 build.py 的 web 阶段生成；convert.py --reverse 用它把转换后的文本还原。
+"""
+
+import array
+import bisect
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"HCRI"
+VERSION = 1
+REVERSE_INDEX_FILE = "web_reverse.bin"
+_HEADER = struct.Struct("<4sHHII")
+
+
+def invert_candidates(candidates, rank=None):
+    """{ 原字: [目标字, ...] }（按优先级）→ { 目标字: [原字, ...] }。
+
+    原字先按目标字在其列表中的序号排序，同序号再按 rank（缺省按码点）。
+    """
+    positions = {}
+    for source, targets in candidates.items():
+        for i, target in enumerate(targets):
+            positions.setdefault(target, {}).setdefault(source, i)
+    key = rank or ord
+    return {
+        t: sorted(sources, key=lambda s: (sources[s], key(s)))
+        for t, sources in positions.items()
+    }
+
+
+def encode_index(reverse):
+    targets = array.array("I")
+    offsets = array.array("I", [0])
+    sources = array.array("I")
+    for target in sorted(reverse, key=ord):
+        targets.append(ord(target))
+        sources.extend(ord(s) for s in reverse[target])
+        offsets.append(len(sources))
+    if sys.byteorder != "little":
+        for a in (targets, offsets, sources):
+            a.byteswap()
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(targets), len(sources))
+    return header + targets.tobytes() + offsets.tobytes() + sources.tobytes()
+
+
+def save_index(path, reverse):
+    data = encode_index(reverse)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+class ReverseIndex:
+    """以 mmap 方式读取 HCRI 文件，按目标字二分查找。"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, n, m = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} 不是 HCRI v{VERSION} 文件")
+        start = _HEADER.size
+        self._targets = self._u32(start, n)
+        self._offsets = self._u32(start + 4 * n, n + 1)
+        self._sources = self._u32(start + 4 * (2 * n + 1), m)
+
+    def _u32(self, start, count):
+        if sys.byteorder == "little":
+            return memoryview(self._mm)[start:start + 4 * count].cast("I")
+        a = array.array("I", self._mm[start:start + 4 * count])
+        a.byteswap()
+        return a
+
+    def __len__(self):
+        return len(self._targets)
+
+    def _index(self, char):
+        cp = ord(char)
+        i = bisect.bisect_left(self._targets, cp)
+        if i < len(self._targets) and self._targets[i] == cp:
+            return i
+        return -1
+
+    def sources(self, char):
+        """换成 char 的全部原字（按优先级）；char 不是目标字时为空串。"""
+        i = self._index(char)
+        if i < 0:
+            return ""
+        return "".join(map(chr, self._sources[self._offsets[i]:self._offsets[i + 1]]))
+
+    def ambiguity(self, char):
+        """换成 char 的原字个数；大于 1 时还原结果只是其中优先级最高者。"""
+        i = self._index(char)
+        return 0 if i < 0 else self._offsets[i + 1] - self._offsets[i]
+
+    def items(self):
+        for i, cp in enumerate(self._targets):
+            yield chr(cp), "".join(map(chr, self._sources[self._offsets[i]:self._offsets[i + 1]]))
+
+    def translate_table(self):
+        """还原用的 str.translate 表：{ 目标字码点: 首选原字 }。"""
+        return {cp: chr(self._sources[self._offsets[i]]) for i, cp in enumerate(self._targets)}
+
+    def close(self):
+        for a in (self._targets, self._offsets, self._sources):
+            if isinstance(a, memoryview):
+                a.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
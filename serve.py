@@ -0,0 +1,393 @@
+"""
+serve.py — 常驻本地转换服务（asyncio + HTTP/1.1，仅标准库）
+
+用法:
+    python serve.py                                 # 监听 127.0.0.1:8765，读取 web_mapping.bin
+    python serve.py --port 9000 --mapping path/to/web_mapping.bin
+    python serve.py --reload-interval 0             # 不监视映射文件
+
+接口（?compat=1 使用兼容映射，与 app.js 的 compatibilityMode 相同）:
+    POST /convert   请求体为 UTF-8 文本，返回转换后的文本
+    POST /batch     {"texts": ["...", ...], "compat": false} → {"results": ["...", ...]}
+                    （请求体中的 compat 优先于 ?compat=）
+    POST /stream    请求体（可为分块传输编码）边读边转换，以分块编码流式返回，适合大文本
+    GET  /stats     各接口请求数、错误数、延迟、字数与吞吐量，及当前映射版本
+    GET  /healthz
+
+映射只在启动时加载一次。映射文件（build.py 的 web 阶段输出）发生变化时，
+后台在线程中加载新表，完整加载后一次性替换引用：进行中的请求继续使用
+开始时取得的旧表，新请求使用新表，不丢请求；新文件无法读取时保留旧表。
+"""
+
+import argparse
+import asyncio
+import codecs
+import json
+import os
+import sys
+import time
+import urllib.parse
+
+from build import WEB_MAPPING_BIN_FILE
+from mapping_bin import BinaryMapping
+
+MAX_BODY = 16 << 20  # /convert 与 /batch 的请求体上限（字节）
+READ_SIZE = 1 << 16
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseAborted(Exception):
+    """响应头已发出后出错：不能再写错误响应，只能断开连接。"""
+
+
+# ──────────────────────────────────────────────
+# 映射：加载与原子热替换
+# ──────────────────────────────────────────────
+
+class MappingStore:
+    """持有 (标准表, 兼容表) 元组；替换只是一次属性赋值，读取方拿到的总是完整的一对表。"""
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 0
+        self.loaded_at = None
+        self.reload_errors = 0
+        self._signature = None
+        self.tables = None
+        self.reload()
+
+    def _stat_signature(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        with BinaryMapping(self.path) as m:
+            return m.translate_table(compat=False), m.translate_table(compat=True)
+
+    def reload(self):
+        signature = self._stat_signature()
+        tables = self._load()
+        self.tables = tables
+        self._signature = signature
+        self.version += 1
+        self.loaded_at = time.time()
+        print(f"已加载 {self.path}（版本 {self.version}，{len(tables[0])} 个映射）", file=sys.stderr)
+
+    def changed(self):
+        try:
+            return self._stat_signature() != self._signature
+        except OSError:
+            return False
+
+    async def watch(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            if not self.changed():
+                continue
+            try:
+                await asyncio.to_thread(self.reload)
+            except (OSError, ValueError) as e:
+                # 文件可能正在被替换或已损坏：保留旧表，下个周期再试
+                self.reload_errors += 1
+                print(f"重新加载 {self.path} 失败，继续使用版本 {self.version}：{e}", file=sys.stderr)
+
+
+# ──────────────────────────────────────────────
+# 计数：请求数、延迟与吞吐量
+# ──────────────────────────────────────────────
+
+class Stats:
+    def __init__(self):
+        self.started = time.time()
+        self.endpoints = {}
+
+    def record(self, endpoint, seconds, chars, error=False):
+        e = self.endpoints.setdefault(endpoint, {
+            "requests": 0, "errors": 0, "chars": 0, "latency_total_s": 0.0, "latency_max_ms": 0.0,
+        })
+        e["requests"] += 1
+        e["errors"] += int(error)
+        e["chars"] += chars
+        e["latency_total_s"] += seconds
+        e["latency_max_ms"] = max(e["latency_max_ms"], seconds * 1000)
+
+    def snapshot(self, store):
+        uptime = time.time() - self.started
+        endpoints = {}
+        for name, e in self.endpoints.items():
+            endpoints[name] = {
+                "requests": e["requests"],
+                "errors": e["errors"],
+                "chars": e["chars"],
+                "latency_avg_ms": round(e["latency_total_s"] * 1000 / e["requests"], 3),
+                "latency_max_ms": round(e["latency_max_ms"], 3),
+                "chars_per_s_busy": round(e["chars"] / e["latency_total_s"]) if e["latency_total_s"] else 0,
+            }
+        total_requests = sum(e["requests"] for e in self.endpoints.values())
+        return {
+            "uptime_s": round(uptime, 1),
+            "requests": total_requests,
+            "requests_per_s": round(total_requests / uptime, 3) if uptime else 0,
+            "endpoints": endpoints,
+            "mapping": {
+                "path": store.path,
+                "version": store.version,
+                "entries": len(store.tables[0]),
+                "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(store.loaded_at)),
+                "reload_errors": store.reload_errors,
+            },
+        }
+
+
+# ──────────────────────────────────────────────
+# HTTP
+# ──────────────────────────────────────────────
+
+def _is_chunked(headers):
+    return "chunked" in headers.get("transfer-encoding", "").lower()
+
+
+def _content_length(headers):
+    try:
+        return int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "Content-Length 无效")
+
+
+async def _iter_body(reader, headers):
+    """按 Content-Length 或分块传输编码逐块读取请求体。"""
+    if _is_chunked(headers):
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            try:
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise HttpError(400, "分块大小无效")
+            if size == 0:
+                # 跳过尾部首部直到空行
+                while (await reader.readuntil(b"\r\n")) != b"\r\n":
+                    pass
+                return
+            yield await reader.readexactly(size)
+            await reader.readexactly(2)
+    else:
+        remaining = _content_length(headers)
+        while remaining > 0:
+            chunk = await reader.read(min(READ_SIZE, remaining))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b"", remaining)
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def _send_continue(writer, headers):
+    """客户端带 Expect: 100-continue 时（如 curl -T）先回 100，否则它会等待约 1 秒再发请求体。"""
+    if headers.get("expect", "").lower() == "100-continue":
+        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        await writer.drain()
+
+
+async def _read_body(reader, writer, headers, limit=MAX_BODY):
+    if not _is_chunked(headers) and _content_length(headers) > limit:
+        raise HttpError(413, f"请求体超过 {limit} 字节，请改用 /stream")
+    await _send_continue(writer, headers)
+    parts = []
+    size = 0
+    async for chunk in _iter_body(reader, headers):
+        size += len(chunk)
+        if size > limit:
+            raise HttpError(413, f"请求体超过 {limit} 字节，请改用 /stream")
+        parts.append(chunk)
+    return b"".join(parts)
+
+
+async def _respond(writer, status, body, content_type="text/plain; charset=utf-8", keep_alive=True):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+def _respond_json(writer, status, data, keep_alive=True):
+    body = json.dumps(data, ensure_ascii=False)
+    return _respond(writer, status, body, "application/json; charset=utf-8", keep_alive)
+
+
+class ConversionServer:
+    def __init__(self, store):
+        self.store = store
+        self.stats = Stats()
+
+    async def handle(self, reader, writer):
+        try:
+            while await self._handle_request(reader, writer):
+                pass
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader, writer):
+        """处理一个请求，返回是否保持连接。"""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return False
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            await _respond(writer, 400, "请求行无效", keep_alive=False)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+        url = urllib.parse.urlsplit(target)
+        query = urllib.parse.parse_qs(url.query)
+        compat = query.get("compat", ["0"])[0].lower() in ("1", "true", "yes")
+        # 请求开始时取得映射引用，热替换不影响进行中的请求
+        tables = self.store.tables
+        table = tables[1 if compat else 0]
+
+        start = time.perf_counter()
+        chars = 0
+        error = False
+        try:
+            if url.path == "/convert" and method == "POST":
+                text = (await _read_body(reader, writer, headers)).decode("utf-8")
+                chars = len(text)
+                await _respond(writer, 200, text.translate(table), keep_alive=keep_alive)
+            elif url.path == "/batch" and method == "POST":
+                chars = await self._batch(reader, writer, headers, tables, compat, keep_alive)
+            elif url.path == "/stream" and method == "POST":
+                chars = await self._stream(reader, writer, headers, table, keep_alive)
+            elif url.path == "/stats" and method == "GET":
+                await _respond_json(writer, 200, self.stats.snapshot(self.store), keep_alive)
+            elif url.path == "/healthz" and method == "GET":
+                await _respond(writer, 200, "ok", keep_alive=keep_alive)
+            elif url.path in ("/convert", "/batch", "/stream", "/stats", "/healthz"):
+                raise HttpError(405, f"{url.path} 不支持 {method}")
+            else:
+                raise HttpError(404, f"未知接口 {url.path}")
+        except ResponseAborted:
+            # 流式响应已开始：不发终止块直接断开，客户端据此得知响应不完整
+            error = True
+            keep_alive = False
+        except HttpError as e:
+            error = True
+            # 请求体可能未读完，出错后关闭连接
+            keep_alive = False
+            await _respond(writer, e.status, str(e), keep_alive=False)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            error = True
+            keep_alive = False
+            await _respond(writer, 400, f"请求体无效：{e}", keep_alive=False)
+        finally:
+            if url.path in ("/convert", "/batch", "/stream"):
+                self.stats.record(url.path, time.perf_counter() - start, chars, error)
+        return keep_alive
+
+    async def _batch(self, reader, writer, headers, tables, compat, keep_alive):
+        data = json.loads(await _read_body(reader, writer, headers))
+        texts = data.get("texts") if isinstance(data, dict) else None
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            raise HttpError(400, '请求体应为 {"texts": ["...", ...]}')
+        # 请求体中的 compat 优先，未给出时沿用 ?compat=
+        table = tables[1 if data.get("compat", compat) else 0]
+        await _respond_json(writer, 200, {"results": [t.translate(table) for t in texts]}, keep_alive)
+        return sum(len(t) for t in texts)
+
+    async def _stream(self, reader, writer, headers, table, keep_alive):
+        if not _is_chunked(headers):
+            _content_length(headers)  # 响应头发出前校验
+        await _send_continue(writer, headers)
+        head = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: text/plain; charset=utf-8\r\n"
+            "Transfer-Encoding: chunked\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1"))
+        # 增量解码：多字节字符可能跨越两个读取块。响应已开始，无法再返回错误码，
+        # 非法 UTF-8 以 U+FFFD 代替
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        chars = 0
+        try:
+            async for chunk in _iter_body(reader, headers):
+                text = decoder.decode(chunk)
+                if not text:
+                    continue
+                chars += len(text)
+                out = text.translate(table).encode("utf-8")
+                writer.write(f"{len(out):x}\r\n".encode("ascii") + out + b"\r\n")
+                await writer.drain()
+        except HttpError as e:
+            raise ResponseAborted(str(e)) from e
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            out = tail.translate(table).encode("utf-8")
+            writer.write(f"{len(out):x}\r\n".encode("ascii") + out + b"\r\n")
+            chars += len(tail)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        return chars
+
+
+async def serve(host, port, mapping_path, reload_interval):
+    store = MappingStore(mapping_path)
+    app = ConversionServer(store)
+    server = await asyncio.start_server(app.handle, host, port)
+    watcher = asyncio.create_task(store.watch(reload_interval)) if reload_interval > 0 else None
+    print(f"监听 http://{host}:{port}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if watcher:
+            watcher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="全女文本地转换服务",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口（默认 8765）")
+    parser.add_argument("--mapping", default=WEB_MAPPING_BIN_FILE,
+                        help=f"HCMB 映射文件（默认 {WEB_MAPPING_BIN_FILE}）")
+    parser.add_argument("--reload-interval", type=float, default=1.0, metavar="SECONDS",
+                        help="检查映射文件变化的间隔秒数（默认 1；0 为不监视）")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.mapping):
+        sys.exit(f"错误：缺少 {args.mapping}，请先运行 python build.py")
+    try:
+        asyncio.run(serve(args.host, args.port, args.mapping, args.reload_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
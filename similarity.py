@@ -0,0 +1,81 @@
+"""
+similarity.py — 基于部件关联矩阵的批量相似度匹配
+
+把查询字与候选字各编码为稀疏的「字 × 部件」0/1 矩阵（部件表取两者并集），
+一次稀疏矩阵乘法得到所有 (查询, 候选) 对的共有部件（加权）数，再向量化地算出
+相似度并逐行取最高分，不在 Python 中逐字循环。
+
+相似度:
+    jaccard   |A ∩ B| / |A ∪ B|
+    weighted  同上，但每个部件按逆文档频率加权：越常见的部件（如「口」「木」）
+              权重越低，共有罕见部件的字得分更高
+
+依赖 numpy 与 scipy（可选依赖，仅在调用 best_matches 时导入）:
+    pip install numpy scipy
+"""
+
+METRICS = ("jaccard", "weighted")
+
+
+def _incidence(sets, vocab):
+    """部件集合序列 → CSR 的 (indptr, indices)，新部件追加到 vocab。"""
+    indptr = [0]
+    indices = []
+    for comps in sets:
+        indices.extend(vocab.setdefault(c, len(vocab)) for c in comps)
+        indptr.append(len(indices))
+    return indptr, indices
+
+
+def best_matches(queries, candidates, metric="jaccard", min_score=0.5):
+    """为每个查询字找相似度最高的候选字。
+
+    queries / candidates: { 字: 部件集合 }。
+    返回 { 查询字: [并列最高分的候选字, ...] }，只含最高分不低于 min_score 的查询字；
+    候选字按 candidates 的遍历顺序排列。
+    """
+    import numpy as np
+    from scipy import sparse
+
+    if metric not in METRICS:
+        raise ValueError(f"未知的相似度：{metric}")
+    q_chars = list(queries)
+    c_chars = list(candidates)
+    if not q_chars or not c_chars:
+        return {}
+
+    vocab = {}
+    q_ptr, q_idx = _incidence((queries[c] for c in q_chars), vocab)
+    c_ptr, c_idx = _incidence((candidates[c] for c in c_chars), vocab)
+    n_vocab = len(vocab)
+    q_mat = sparse.csr_matrix(
+        (np.ones(len(q_idx)), q_idx, q_ptr), shape=(len(q_chars), n_vocab)
+    )
+    c_mat = sparse.csr_matrix(
+        (np.ones(len(c_idx)), c_idx, c_ptr), shape=(len(c_chars), n_vocab)
+    )
+
+    if metric == "weighted":
+        df = np.bincount(q_idx, minlength=n_vocab) + np.bincount(c_idx, minlength=n_vocab)
+        weights = np.log((len(q_chars) + len(c_chars) + 1) / (df + 1)) + 1
+    else:
+        weights = np.ones(n_vocab)
+
+    # 共有部件权重和：(查询 × 部件) · diag(w) · (部件 × 候选)
+    inter = (q_mat @ sparse.diags(weights) @ c_mat.T).tocsr()
+    inter.eliminate_zeros()
+    q_total = q_mat @ weights
+    c_total = c_mat @ weights
+
+    rows = np.repeat(np.arange(len(q_chars)), np.diff(inter.indptr))
+    cols = inter.indices
+    score = inter.data / (q_total[rows] + c_total[cols] - inter.data)
+
+    best = np.zeros(len(q_chars))
+    np.maximum.at(best, rows, score)
+    keep = (score >= min_score) & (score >= best[rows] - 1e-9)
+
+    result = {}
+    for r, c in zip(rows[keep].tolist(), cols[keep].tolist()):
+        result.setdefault(q_chars[r], []).append(c)
+    return {q: [c_chars[c] for c in sorted(cs)] for q, cs in result.items()}
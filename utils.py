@@ -1,5 +1,8 @@
 import re
 import os
+import sys
+import functools
+import collections
 from datetime import datetime
 import logging
 
@@ -46,31 +49,47 @@ def setup_logger():
     return logger
 
 
+# 单次扫描分词：IDC | 实体 &...; | 单个字符，按出现顺序逐个匹配
+_IDS_TOKEN_RE = re.compile(f'({IDC_REGEX})|(&[^;]+;)|(.)', re.S)
+
+# idcs: 结构符序列；chars: 普通汉字部件（保留重复）；entities: &...; 实体部件
+IdsTokens = collections.namedtuple('IdsTokens', ['idcs', 'chars', 'entities'])
+
+_EMPTY_TOKENS = IdsTokens((), (), ())
+
+
+@functools.lru_cache(maxsize=None)
+def tokenize_ids(ids_str):
+    """
+    将 IDS 字符串一次扫描切分为 IdsTokens，部件字符串经 sys.intern 驻留。
+    结果按 IDS 字符串缓存，同一字（及共用 IDS 的字）重复调用不再重新扫描。
+    """
+    if not ids_str:
+        return _EMPTY_TOKENS
+    idcs, chars, entities = [], [], []
+    for idc, entity, char in _IDS_TOKEN_RE.findall(ids_str):
+        if idc:
+            idcs.append(sys.intern(idc))
+        elif entity:
+            entities.append(sys.intern(entity))
+        else:
+            chars.append(sys.intern(char))
+    return IdsTokens(tuple(idcs), tuple(chars), tuple(entities))
+
+
 def get_ids_components_list(ids_str, remove_char=None):
     """
     将 IDS 字符串解析为组件列表 (List)。
+    顺序为普通汉字在前、实体在后，保留重复项。
     """
-    if not ids_str:
-        return []
-    
-    # 1. 移除 IDC
-    cleaned = re.sub(IDC_REGEX, '', ids_str)
-    
-    # 2. 提取实体组件 (例如 &CDP-8BBF;)
-    entities = re.findall(r'&[^;]+;', cleaned)
-    
-    # 3. 提取普通汉字 (移除实体后剩余的部分)
-    temp_str = re.sub(r'&[^;]+;', '', cleaned)
-    chars = list(temp_str) # 转为 list，保留重复项
-    
-    # 4. 合并
-    all_comps = chars + entities
-    
-    # 5. 如果需要移除目标字符 (例如 '女')
+    tokens = tokenize_ids(ids_str)
+    all_comps = list(tokens.chars + tokens.entities)
+
+    # 如果需要移除目标字符 (例如 '女')
     if remove_char:
         # 使用列表推导式过滤，保留其他重复的组件
         all_comps = [c for c in all_comps if c != remove_char]
-        
+
     return all_comps
 
 
@@ -82,25 +101,11 @@ def get_components_except_target_char(ids_str, target_char='女'):
     3. 将剩余的普通汉字视为组件。
     4. 返回一个字符集合 set。
     """
-    if not ids_str:
-        return set()
-    
-    # 1. 移除 IDC
-    cleaned = re.sub(IDC_REGEX, '', ids_str)
-    
-    # 2. 提取实体组件 (例如 &CDP-8BBF;)
-    # 使用 findall 找到所有 &...; 格式的字符串
-    entities = set(re.findall(r'&[^;]+;', cleaned))
-    
-    # 3. 为了提取普通汉字，先将实体从字符串中移除，避免 & c d p ; 被拆成单字
-    temp_str = re.sub(r'&[^;]+;', '', cleaned)
-    
-    # 4. 提取普通字符组件，并移除目标字符
-    chars = set(temp_str)
-    chars.discard(target_char)
-    
-    # 5. 合并实体集合和字符集合
-    return chars | entities
+    tokens = tokenize_ids(ids_str)
+    comps = set(tokens.chars)
+    comps.discard(target_char)
+    comps.update(tokens.entities)
+    return comps
 
 
 def extract_single_component(ids_str, target_char='女'):
@@ -0,0 +1,59 @@
+// worker.js — 在后台线程中转换文本，按块回传结果
+//
+// 主线程消息：
+//   { type: 'merge', full, less }      合并新加载的字典分片
+//   { type: 'missing', chars }         缺字表（需要 SVG 字形的目标字）
+//   { type: 'candidates', full, less }  每个字的候选字列表（换字用）
+//   { type: 'convert', id, text, compat, pick }   pick > 0 时各字取第 pick 个候选
+// 回传消息：
+//   { type: 'chunk', id, text, hasMissing, done }   按输入顺序，最后一块 done 为 true
+
+const CHUNK_SIZE = 1 << 16; // 每块 UTF-16 码元数
+
+const full = {};
+const less = {};
+let candidates = null;
+let missing = new Set();
+
+function convertChunk(text, mapping, cands, pick) {
+  let out = '';
+  let hasMissing = false;
+  for (const char of text) {
+    const list = cands && cands[char];
+    const target = list ? list[pick % list.length] : mapping[char];
+    if (target === undefined) {
+      out += char;
+    } else {
+      out += target;
+      if (!hasMissing && missing.has(target)) hasMissing = true;
+    }
+  }
+  return { out, hasMissing };
+}
+
+self.onmessage = e => {
+  const msg = e.data;
+  if (msg.type === 'merge') {
+    Object.assign(full, msg.full);
+    Object.assign(less, msg.less);
+  } else if (msg.type === 'candidates') {
+    candidates = { full: msg.full, less: msg.less };
+  } else if (msg.type === 'missing') {
+    missing = new Set(Array.from(msg.chars));
+  } else if (msg.type === 'convert') {
+    const { id, text } = msg;
+    const mapping = msg.compat ? less : full;
+    const pick = msg.pick || 0;
+    const cands = pick && candidates ? (msg.compat ? candidates.less : candidates.full) : null;
+    let i = 0;
+    do {
+      let end = Math.min(i + CHUNK_SIZE, text.length);
+      // 不在代理对中间切开
+      const c = text.charCodeAt(end - 1);
+      if (end < text.length && c >= 0xD800 && c <= 0xDBFF) end++;
+      const { out, hasMissing } = convertChunk(text.slice(i, end), mapping, cands, pick);
+      self.postMessage({ type: 'chunk', id, text: out, hasMissing, done: end >= text.length });
+      i = end;
+    } while (i < text.length);
+  }
+};